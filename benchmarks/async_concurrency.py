@@ -0,0 +1,142 @@
+"""Concurrency scaling of the sync (gunicorn wsgi) and async (asgi) servers.
+
+Starts each server, measures its resident memory (master plus workers),
+then drives one route at increasing client concurrency. Pick --sync-workers
+and --async-workers so both servers use about the same memory and compare
+requests/sec and tail latency. Results are most meaningful against a real
+Postgres (DATABASE_URL), where queries wait on the network; Linux only,
+memory is read from /proc.
+
+    python benchmarks/async_concurrency.py --database-url postgresql://... \\
+        --sync-workers 4 --async-workers 1 --levels 1,8,32,128 --output async.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load import SRC, seed, percentile, free_port, HTTPClient  # noqa: E402
+
+
+def process_tree_rss(pid):
+    # Sum VmRSS (kB) of pid and every descendant
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % entry) as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open("/proc/%d/status" % current) as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total / 1024.0
+
+
+def start_server(kind, database_url, profile, workers):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, APP_PROFILE=profile)
+    command = [sys.executable, "-m", "gunicorn", "--chdir", SRC, "--workers", str(workers),
+               "--bind", "127.0.0.1:%d" % port, "--log-level", "warning"]
+    if kind == "async":
+        command += ["--worker-class", "uvicorn.workers.UvicornWorker", "asgi:application"]
+    else:
+        command += ["wsgi"]
+    process = subprocess.Popen(command, env=env)
+    base_url = "http://127.0.0.1:%d" % port
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + "/planets?limit=1").read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("%s server did not start" % kind)
+
+
+def drive(client, route, concurrency, requests):
+    def one(_):
+        start = time.perf_counter()
+        status = client.get(route)
+        return time.perf_counter() - start, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies = [sample[0] for sample in samples]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for sample in samples if sample[1] >= 400),
+        "requests_per_second": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:////tmp/async_bench.db")
+    parser.add_argument("--profile", default="api")
+    parser.add_argument("--route", default="/planets?limit=50")
+    parser.add_argument("--levels", default="1,8,32,128", help="client concurrency levels")
+    parser.add_argument("--requests", type=int, default=500, help="requests per level")
+    parser.add_argument("--sync-workers", type=int, default=4)
+    parser.add_argument("--async-workers", type=int, default=1)
+    parser.add_argument("--planets", type=int, default=2000)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+    if not args.no_seed:
+        os.environ["DATABASE_URL"] = args.database_url
+        sys.path.insert(0, SRC)
+        from app import create_app
+        seed(create_app("api"), users=100, planets=args.planets, characters=args.planets, favorites_per_user=5)
+
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "servers": {}}
+    for kind, workers in (("sync", args.sync_workers), ("async", args.async_workers)):
+        process, base_url = start_server(kind, args.database_url, args.profile, workers)
+        try:
+            client = HTTPClient(base_url)
+            drive(client, args.route, 4, 50)  # warm up every worker
+            levels = [drive(client, args.route, int(level), args.requests) for level in args.levels.split(",")]
+            report["servers"][kind] = {
+                "workers": workers,
+                "rss_mb": round(process_tree_rss(process.pid), 1),
+                "levels": levels,
+            }
+        finally:
+            process.terminate()
+            process.wait()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Favorite writes/sec with and without group commit.
+
+Runs the same favorite toggles twice, in process with one Flask test
+client per thread: first with FAVORITE_GROUP_COMMIT_MS=0 (one transaction
+and commit per request), then with --window-ms. Each thread is its own
+user and alternately adds and removes a favorite planet through
+POST /favorite/planet/<id> and DELETE /favorite/planet/<id>?user_id=.
+Reports writes/sec, p50/p95/p99 latency and commits per write. Commits
+are what group commit saves, so compare on the database you deploy to:
+a file SQLite or a Postgres with synchronous_commit on.
+
+    python benchmarks/group_commit.py --threads 32 --writes 4000 --window-ms 2 --output group.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load import seed, percentile  # noqa: E402
+
+
+def toggle(client, user_id, planet_id, add):
+    if add:
+        return client.post("/favorite/planet/%d" % planet_id, json={"user_id": user_id}).status_code
+    return client.delete("/favorite/planet/%d?user_id=%d" % (planet_id, user_id)).status_code
+
+
+def reset_favorites(app):
+    # Start every mode with no favorites, whatever the previous run left
+    from models import db, Favorite, Planet
+    with app.app_context():
+        db.session.execute(db.delete(Favorite))
+        db.session.execute(db.update(Planet).values(favorite_count=0))
+        db.session.commit()
+
+
+def drive(app, threads, writes, planets):
+    from sqlalchemy import event
+    from models import db
+
+    commits = []
+    with app.app_context():
+        engine = db.engine
+
+    def listener(connection):
+        commits.append(1)
+
+    event.listen(engine, "commit", listener)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = app.test_client()
+        user_id = index + 1
+        # An even number of steps, so each thread ends with its favorites removed
+        for step in range(writes // threads // 2 * 2):
+            start = time.perf_counter()
+            # Even steps add a favorite, odd steps remove it again
+            status = toggle(client, user_id, (index + step // 2) % planets + 1, step % 2 == 0)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                if status not in (200, 201):
+                    errors.append(status)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+    event.remove(engine, "commit", listener)
+    done = len(latencies)
+    return {
+        "writes": done,
+        "errors": len(errors),
+        "writes_per_sec": round(done / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "commits_per_write": round(len(commits) / done, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:////tmp/group_commit_bench.db")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--writes", type=int, default=4000, help="writes per mode")
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-group", type=int, default=64)
+    parser.add_argument("--planets", type=int, default=100)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+    os.environ["FAVORITE_GROUP_COMMIT_MAX"] = str(args.max_group)
+    from app import create_app
+
+    report = {"config": {key: value for key, value in vars(args).items() if key != "output"}, "modes": {}}
+    for mode, window in (("direct", 0), ("group_commit", args.window_ms)):
+        os.environ["FAVORITE_GROUP_COMMIT_MS"] = str(window)
+        app = create_app("api")
+        if mode == "direct" and not args.no_seed:
+            seed(app, users=args.threads, planets=args.planets, characters=1, favorites_per_user=0)
+        reset_favorites(app)
+        drive(app, args.threads, args.threads * 4, args.planets)  # warm up
+        report["modes"][mode] = drive(app, args.threads, args.writes, args.planets)
+    modes = report["modes"]
+    report["speedup"] = round(modes["group_commit"]["writes_per_sec"] / modes["direct"]["writes_per_sec"], 2)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
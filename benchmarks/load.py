@@ -0,0 +1,250 @@
+"""Load benchmark for every GET route listed by the sitemap.
+
+Seeds a database (SQLite by default, or any DATABASE_URL such as a local
+Postgres), then drives each route with concurrent clients, in process
+through the Flask test client and/or over HTTP against gunicorn, and
+reports p50/p95/p99 latency, requests/sec and SQL queries per request.
+
+    python benchmarks/load.py --users 1000 --planets 5000 --characters 5000 \\
+        --favorites-per-user 10 --mode both --concurrency 8 --output run.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+
+# Routes that describe the server rather than the API
+SKIPPED_ROUTES = {"/metrics", "/swagger.json"}
+
+
+def seed(app, users, planets, characters, favorites_per_user, batch_size=5000):
+    from sqlalchemy import insert
+    from models import db, User, Planet, Character, Favorite
+
+    def insert_rows(model, rows):
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(insert(model), rows[start:start + batch_size])
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        insert_rows(User, [{"email": "user%d@example.com" % i, "password": "secret",
+                            "first_name": "User", "last_name": str(i)} for i in range(users)])
+        insert_rows(Planet, [{"name": "Planet %d" % i, "description": "Planet number %d" % i}
+                             for i in range(planets)])
+        insert_rows(Character, [{"name": "Character %d" % i, "description": "Character number %d" % i}
+                                for i in range(characters)])
+        favorites = []
+        for user_id in range(1, users + 1):
+            for planet_id in random.sample(range(1, planets + 1), min(favorites_per_user, planets)):
+                favorites.append({"user_id": user_id, "planet_id": planet_id, "character_id": None})
+            for character_id in random.sample(range(1, characters + 1), min(favorites_per_user, characters)):
+                favorites.append({"user_id": user_id, "planet_id": None, "character_id": character_id})
+        insert_rows(Favorite, favorites)
+        db.session.commit()
+
+
+def sitemap_routes(app):
+    from utils import has_no_empty_params
+    routes = []
+    for rule in app.url_map.iter_rules():
+        if "GET" in rule.methods and has_no_empty_params(rule) and "/admin/" not in rule.rule:
+            if rule.rule not in SKIPPED_ROUTES and not rule.rule.startswith("/static"):
+                routes.append(rule.rule)
+    return sorted(set(routes))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+METRIC_LINE = re.compile(r'^(\w+)\{endpoint="([^"]*)"(?:,method="GET",status="\d+")?\} ([0-9.e+-]+)$')
+
+
+def endpoint_counters(metrics_text):
+    # Returns {endpoint: {"requests": n, "queries": n}} from /metrics output
+    counters = {}
+    for line in metrics_text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match is None:
+            continue
+        name, endpoint, value = match.groups()
+        entry = counters.setdefault(endpoint, {"requests": 0, "queries": 0})
+        if name == "http_requests_total":
+            entry["requests"] += float(value)
+        elif name == "http_request_sql_queries_total":
+            entry["queries"] += float(value)
+    return counters
+
+
+def queries_per_request(before, after, route):
+    start = before.get(route, {"requests": 0, "queries": 0})
+    end = after.get(route, {"requests": 0, "queries": 0})
+    requests = end["requests"] - start["requests"]
+    if requests <= 0:
+        return None
+    return (end["queries"] - start["queries"]) / requests
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def get(self, path):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.get(path)
+        response.get_data()
+        return response.status_code
+
+    def metrics(self):
+        return self.app.test_client().get("/metrics").get_data(as_text=True)
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.base_url + path) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            return error.code
+
+    def metrics(self):
+        with urllib.request.urlopen(self.base_url + "/metrics") as response:
+            return response.read().decode()
+
+
+def run_route(client, route, requests, concurrency):
+    def one(_):
+        start = time.perf_counter()
+        status = client.get(route)
+        return time.perf_counter() - start, status
+
+    before = endpoint_counters(client.metrics())
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    after = endpoint_counters(client.metrics())
+
+    latencies = [sample[0] for sample in samples]
+    return {
+        "requests": requests,
+        "errors": sum(1 for sample in samples if sample[1] >= 400),
+        "requests_per_second": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        # With several gunicorn workers this is measured on the worker that
+        # answered the scrape, which is still a fair per-request estimate
+        "queries_per_request": queries_per_request(before, after, route),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(database_url, profile, workers, threads):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, APP_PROFILE=profile)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "wsgi", "--chdir", SRC, "--workers", str(workers),
+         "--threads", str(threads), "--bind", "127.0.0.1:%d" % port, "--log-level", "warning"],
+        env=env)
+    base_url = "http://127.0.0.1:%d" % port
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + "/metrics").read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:////tmp/load_bench.db")
+    parser.add_argument("--profile", default="api")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--planets", type=int, default=1000)
+    parser.add_argument("--characters", type=int, default=1000)
+    parser.add_argument("--favorites-per-user", type=int, default=5)
+    parser.add_argument("--no-seed", action="store_true", help="reuse the existing database")
+    parser.add_argument("--mode", choices=("inprocess", "gunicorn", "both"), default="inprocess")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["APP_PROFILE"] = args.profile
+    os.environ.setdefault("METRICS_SLOW_REQUEST_MS", "1000000")
+    os.environ.setdefault("METRICS_SLOW_QUERY_MS", "1000000")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+    from app import create_app
+    app = create_app(args.profile)
+
+    if not args.no_seed:
+        started = time.perf_counter()
+        seed(app, args.users, args.planets, args.characters, args.favorites_per_user)
+        print("seeded in %.1fs" % (time.perf_counter() - started), file=sys.stderr)
+
+    routes = sitemap_routes(app)
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "routes": routes,
+        "results": {},
+    }
+    modes = ("inprocess", "gunicorn") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        process = None
+        if mode == "inprocess":
+            client = InProcessClient(app)
+        else:
+            process, base_url = start_gunicorn(args.database_url, args.profile, args.workers, args.threads)
+            client = HTTPClient(base_url)
+        try:
+            report["results"][mode] = {
+                route: run_route(client, route, args.requests, args.concurrency) for route in routes
+            }
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
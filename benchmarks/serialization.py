@@ -0,0 +1,93 @@
+"""Per-row cost of building a list response, old path versus new path.
+
+Times each stage of rendering the same rows:
+  - orm:    ORM instances + Model.serialize() + the stdlib JSON provider
+  - rows:   row tuples (Row._asdict()) + the stdlib JSON provider
+  - orjson: row tuples + the orjson provider (what /planets uses now)
+plus the encoder alone on the same prebuilt dicts (encode_stdlib,
+encode_orjson), and prints microseconds per row for each, best of --repeat runs.
+
+    python benchmarks/serialization.py --rows 20000 --repeat 5 --output serialization.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from load import seed  # noqa: E402
+
+
+def best_of(repeat, run):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:////tmp/serialization_bench.db")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url
+    from flask.json.provider import DefaultJSONProvider
+    from app import create_app
+    from formats import ORJSONProvider, orjson
+    from models import db, Planet
+
+    app = create_app("api")
+    if not args.no_seed:
+        seed(app, users=1, planets=args.rows, characters=1, favorites_per_user=0)
+    stdlib = DefaultJSONProvider(app)
+    fast = ORJSONProvider(app) if orjson is not None else None
+    columns = [getattr(Planet, field) for field in Planet.serialize_fields]
+
+    def orm(provider):
+        def run():
+            planets = Planet.query.order_by(Planet.id).all()
+            provider.response([planet.serialize() for planet in planets]).get_data()
+            db.session.expunge_all()
+        return run
+
+    def rows(provider):
+        def run():
+            result = db.session.query(*columns).order_by(Planet.id).all()
+            provider.response([row._asdict() for row in result]).get_data()
+        return run
+
+    def encode(provider, items):
+        return lambda: provider.response(items).get_data()
+
+    report = {"rows": args.rows, "repeat": args.repeat, "us_per_row": {}}
+    with app.app_context():
+        items = [row._asdict() for row in db.session.query(*columns).order_by(Planet.id)]
+        cases = {"orm": orm(stdlib), "rows": rows(stdlib), "encode_stdlib": encode(stdlib, items)}
+        if fast is not None:
+            cases["orjson"] = rows(fast)
+            cases["encode_orjson"] = encode(fast, items)
+        count = db.session.query(Planet).count()
+        for name, run in cases.items():
+            run()  # warm up
+            report["us_per_row"][name] = round(best_of(args.repeat, run) / count * 1e6, 3)
+    if fast is None:
+        report["note"] = "orjson is not installed, only the stdlib cases ran"
+    else:
+        report["speedup"] = round(report["us_per_row"]["orm"] / report["us_per_row"]["orjson"], 2)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Cold-start benchmark: import time and time to first request per profile.
+
+Every run starts a fresh interpreter so nothing is cached between runs.
+
+    python benchmarks/startup.py --runs 10 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+SETUP = """
+import app
+with app.app.app_context():
+    app.db.create_all()
+"""
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get("/planets?limit=1")
+first_request = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "first_request_seconds": first_request - imported,
+    "status": response.status_code,
+}))
+"""
+
+
+def create_tables(database_url):
+    env = dict(os.environ, APP_PROFILE="api", DATABASE_URL=database_url)
+    subprocess.run([sys.executable, "-c", SETUP], cwd=SRC, env=env, check=True)
+
+
+def run_once(profile, database_url):
+    env = dict(os.environ, APP_PROFILE=profile, DATABASE_URL=database_url)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", PROBE], cwd=SRC, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - start
+    return result
+
+
+def summarize(values):
+    return {
+        "min": min(values),
+        "median": statistics.median(values),
+        "max": max(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profiles", default="full,api")
+    parser.add_argument("--database-url", default="sqlite:////tmp/startup_bench.db")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args()
+
+    create_tables(args.database_url)
+    report = {}
+    for profile in args.profiles.split(","):
+        runs = [run_once(profile, args.database_url) for _ in range(args.runs)]
+        report[profile] = {
+            key: summarize([run[key] for run in runs])
+            for key in ("import_seconds", "first_request_seconds", "process_seconds")
+        }
+        report[profile]["statuses"] = sorted(set(run["status"] for run in runs))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""txid en change para que el token de GET /changes siga el orden de commit
+
+Revision ID: 1c9e4f6a8b3d
+Revises: f7d3b5c9a1e2
+Create Date: 2026-10-18 10:12:09.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c9e4f6a8b3d'
+down_revision = 'f7d3b5c9a1e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing entries get 0 and sort first, so old tokens (a bare id) keep working as (0, id)
+    op.add_column('change', sa.Column('txid', sa.BigInteger(), nullable=False, server_default='0'))
+    op.create_index('ix_change_position', 'change', ['txid', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_change_position', table_name='change')
+    op.drop_column('change', 'txid')
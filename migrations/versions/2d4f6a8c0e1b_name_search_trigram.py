@@ -0,0 +1,52 @@
+"""Indice trigram FTS5 en SQLite para ?search= (subcadenas, como en Postgres)
+
+Revision ID: 2d4f6a8c0e1b
+Revises: 1c9e4f6a8b3d
+Create Date: 2026-10-18 11:26:44.813502
+
+"""
+import sqlite3
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d4f6a8c0e1b'
+down_revision = '1c9e4f6a8b3d'
+branch_labels = None
+depends_on = None
+
+TABLES = ('planet', 'character')
+# remove_diacritics for the trigram tokenizer needs SQLite 3.45
+TOKENIZE = "trigram case_sensitive 0" + (" remove_diacritics 1" if sqlite3.sqlite_version_info >= (3, 45) else "")
+
+
+def sqlite_trigram_ddl(table):
+    fts = table + "_fts_trigram"
+    return [
+        "CREATE VIRTUAL TABLE %s USING fts5(name, content='%s', content_rowid='id', "
+        "tokenize='%s')" % (fts, table, TOKENIZE),
+        "CREATE TRIGGER %s_ai AFTER INSERT ON %s BEGIN "
+        "INSERT INTO %s(rowid, name) VALUES (new.id, new.name); END" % (fts, table, fts),
+        "CREATE TRIGGER %s_ad AFTER DELETE ON %s BEGIN "
+        "INSERT INTO %s(%s, rowid, name) VALUES ('delete', old.id, old.name); END" % (fts, table, fts, fts),
+        "CREATE TRIGGER %s_au AFTER UPDATE ON %s BEGIN "
+        "INSERT INTO %s(%s, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO %s(rowid, name) VALUES (new.id, new.name); END" % (fts, table, fts, fts, fts),
+        "INSERT INTO %s(%s) VALUES ('rebuild')" % (fts, fts),
+    ]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for table in TABLES:
+            for statement in sqlite_trigram_ddl(table):
+                op.execute(statement)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for table in TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS %s_fts_trigram_%s' % (table, suffix))
+            op.execute('DROP TABLE IF EXISTS %s_fts_trigram' % table)
@@ -0,0 +1,41 @@
+"""Indices y restricciones unicas en favorite
+
+Revision ID: a3f1c2d4e5b6
+Revises: 650f4be04be2
+Create Date: 2026-10-17 10:12:40.512337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c2d4e5b6'
+down_revision = '650f4be04be2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop duplicated favorites first so the unique indexes can be built
+    op.execute(
+        "DELETE FROM favorite WHERE id NOT IN ("
+        "SELECT MIN(id) FROM favorite GROUP BY user_id, planet_id, character_id)"
+    )
+    op.create_index('ix_favorite_user_id', 'favorite', ['user_id', 'planet_id', 'character_id'])
+    op.create_index('ix_favorite_planet_id', 'favorite', ['planet_id'])
+    op.create_index('ix_favorite_character_id', 'favorite', ['character_id'])
+    op.create_index('uq_favorite_user_planet', 'favorite', ['user_id', 'planet_id'], unique=True,
+                    postgresql_where=sa.text('planet_id IS NOT NULL'),
+                    sqlite_where=sa.text('planet_id IS NOT NULL'))
+    op.create_index('uq_favorite_user_character', 'favorite', ['user_id', 'character_id'], unique=True,
+                    postgresql_where=sa.text('character_id IS NOT NULL'),
+                    sqlite_where=sa.text('character_id IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('uq_favorite_user_character', table_name='favorite')
+    op.drop_index('uq_favorite_user_planet', table_name='favorite')
+    op.drop_index('ix_favorite_character_id', table_name='favorite')
+    op.drop_index('ix_favorite_planet_id', table_name='favorite')
+    op.drop_index('ix_favorite_user_id', table_name='favorite')
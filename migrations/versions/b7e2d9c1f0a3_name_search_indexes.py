@@ -0,0 +1,75 @@
+"""Indices de busqueda por nombre en planet y character
+
+Revision ID: b7e2d9c1f0a3
+Revises: a3f1c2d4e5b6
+Create Date: 2026-10-17 12:03:18.220941
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d9c1f0a3'
+down_revision = 'a3f1c2d4e5b6'
+branch_labels = None
+depends_on = None
+
+TABLES = ('planet', 'character')
+
+
+def sqlite_fts_ddl(table):
+    fts = table + "_fts"
+    return [
+        "CREATE VIRTUAL TABLE %s USING fts5(name, content='%s', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')" % (fts, table),
+        "CREATE TRIGGER %s_ai AFTER INSERT ON %s BEGIN "
+        "INSERT INTO %s(rowid, name) VALUES (new.id, new.name); END" % (fts, table, fts),
+        "CREATE TRIGGER %s_ad AFTER DELETE ON %s BEGIN "
+        "INSERT INTO %s(%s, rowid, name) VALUES ('delete', old.id, old.name); END" % (fts, table, fts, fts),
+        "CREATE TRIGGER %s_au AFTER UPDATE ON %s BEGIN "
+        "INSERT INTO %s(%s, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO %s(rowid, name) VALUES (new.id, new.name); END" % (fts, table, fts, fts, fts),
+        "INSERT INTO %s(%s) VALUES ('rebuild')" % (fts, fts),
+    ]
+
+
+def upgrade():
+    for table in TABLES:
+        op.create_index('ix_%s_name' % table, table, ['name'])
+
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        # unaccent() is only STABLE, an IMMUTABLE wrapper is needed to index it
+        op.execute(
+            "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text "
+            "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS "
+            "$$ SELECT public.unaccent('public.unaccent', $1) $$"
+        )
+        for table in TABLES:
+            op.execute(
+                'CREATE INDEX ix_%s_name_trgm ON "%s" USING gin (f_unaccent(lower(name)) gin_trgm_ops)'
+                % (table, table)
+            )
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            for statement in sqlite_fts_ddl(table):
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in TABLES:
+            op.execute('DROP INDEX IF EXISTS ix_%s_name_trgm' % table)
+        op.execute("DROP FUNCTION IF EXISTS f_unaccent(text)")
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute('DROP TRIGGER IF EXISTS %s_fts_%s' % (table, suffix))
+            op.execute('DROP TABLE IF EXISTS %s_fts' % table)
+
+    for table in TABLES:
+        op.drop_index('ix_%s_name' % table, table_name=table)
@@ -0,0 +1,49 @@
+"""ON DELETE CASCADE en las claves foraneas de favorite
+
+Revision ID: c4a8e1f2d3b5
+Revises: b7e2d9c1f0a3
+Create Date: 2026-10-17 14:26:05.734190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a8e1f2d3b5'
+down_revision = 'b7e2d9c1f0a3'
+branch_labels = None
+depends_on = None
+
+FOREIGN_KEYS = (('user_id', 'user'), ('planet_id', 'planet'), ('character_id', 'character'))
+
+# Lets batch mode on SQLite find the unnamed constraints by name
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def replace_foreign_keys(ondelete):
+    if op.get_bind().dialect.name == 'sqlite':
+        with op.batch_alter_table('favorite', naming_convention=NAMING_CONVENTION, recreate='always') as batch_op:
+            for column, referred in FOREIGN_KEYS:
+                name = 'fk_favorite_%s_%s' % (column, referred)
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+        return
+    for column, referred in FOREIGN_KEYS:
+        name = 'favorite_%s_fkey' % column
+        op.drop_constraint(name, 'favorite', type_='foreignkey')
+        op.create_foreign_key(name, 'favorite', referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    # Favorites pointing at rows that no longer exist would break the new constraints
+    for column, referred in FOREIGN_KEYS:
+        op.execute(
+            'DELETE FROM favorite WHERE %s IS NOT NULL AND %s NOT IN (SELECT id FROM "%s")'
+            % (column, column, referred)
+        )
+    replace_foreign_keys('CASCADE')
+
+
+def downgrade():
+    replace_foreign_keys(None)
@@ -0,0 +1,53 @@
+"""created_at/updated_at y registro de cambios para GET /changes
+
+Revision ID: d5b9f3a7e2c1
+Revises: c4a8e1f2d3b5
+Create Date: 2026-10-17 16:08:41.512377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b9f3a7e2c1'
+down_revision = 'c4a8e1f2d3b5'
+branch_labels = None
+depends_on = None
+
+TABLES = ('planet', 'character', 'favorite')
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('created_at', sa.DateTime(), nullable=True))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute('UPDATE "%s" SET created_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP' % table)
+
+    op.create_table('change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('deleted', sa.Boolean(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    op.create_index('ix_change_table_row', 'change', ['table_name', 'row_id'])
+
+    # Every existing row is a change for clients syncing from scratch
+    for table in TABLES:
+        op.execute(
+            "INSERT INTO change (table_name, row_id, deleted, changed_at) "
+            "SELECT '%s', id, false, CURRENT_TIMESTAMP FROM \"%s\" ORDER BY id" % (table, table)
+        )
+
+
+def downgrade():
+    op.drop_index('ix_change_table_row', table_name='change')
+    op.drop_table('change')
+    # Plain ALTER TABLE DROP COLUMN (SQLite 3.35+): recreating planet and
+    # character in batch mode would drop their FTS triggers
+    for table in TABLES:
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'created_at')
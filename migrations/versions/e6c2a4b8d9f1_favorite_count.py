@@ -0,0 +1,34 @@
+"""favorite_count desnormalizado en planet y character
+
+Revision ID: e6c2a4b8d9f1
+Revises: d5b9f3a7e2c1
+Create Date: 2026-10-17 18:42:10.204913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c2a4b8d9f1'
+down_revision = 'd5b9f3a7e2c1'
+branch_labels = None
+depends_on = None
+
+COUNTED = (('planet', 'planet_id'), ('character', 'character_id'))
+
+
+def upgrade():
+    for table, column in COUNTED:
+        op.add_column(table, sa.Column('favorite_count', sa.Integer(), nullable=False, server_default='0'))
+        op.execute(
+            'UPDATE "{table}" SET favorite_count = '
+            '(SELECT count(*) FROM favorite WHERE favorite.{column} = "{table}".id)'.format(table=table, column=column))
+        op.create_index('ix_%s_favorite_count' % table, table, ['favorite_count', 'id'])
+
+
+def downgrade():
+    for table, _ in COUNTED:
+        op.drop_index('ix_%s_favorite_count' % table, table_name=table)
+        # Plain DROP COLUMN, batch mode would rebuild the table and lose the FTS triggers
+        op.drop_column(table, 'favorite_count')
@@ -0,0 +1,34 @@
+"""created_at/updated_at en user e indices de updated_at para los ETags
+
+Revision ID: f7d3b5c9a1e2
+Revises: e6c2a4b8d9f1
+Create Date: 2026-10-17 21:05:37.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7d3b5c9a1e2'
+down_revision = 'e6c2a4b8d9f1'
+branch_labels = None
+depends_on = None
+
+TABLES = ('user', 'planet', 'character', 'favorite')
+
+
+def upgrade():
+    op.add_column('user', sa.Column('created_at', sa.DateTime(), nullable=True))
+    op.add_column('user', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE "user" SET created_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP')
+    for table in TABLES:
+        op.create_index('ix_%s_updated_at' % table, table, ['updated_at'])
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_%s_updated_at' % table, table_name=table)
+    # Plain DROP COLUMN (SQLite 3.35+), which works once ix_user_updated_at is gone
+    op.drop_column('user', 'updated_at')
+    op.drop_column('user', 'created_at')
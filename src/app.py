@@ -1,39 +1,85 @@
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from flask import Flask, Blueprint, request, jsonify, url_for, current_app
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy.orm import selectinload, joinedload
+from utils import APIException, generate_sitemap, paginate, add_pagination_headers, \
+    wants_stream, stream_response, encode_cursor, decode_cursor, MAX_PAGE_SIZE
+from cache import cache
+from compression import setup_compression, compressed_cache
+from pool import engine_options, setup_pool, pool_status
+from replicas import setup_replicas
+from metrics import setup_metrics
+from ratelimit import limiter
+from snapshot import snapshot_cli
+from bulk import read_bulk_items, get_batch_size, to_int, existing_ids, \
+    bulk_create, bulk_response, validate_catalog_item, delete_by_ids
+from search import filter_catalog, parse_ids, popular
+from projection import requested_fields, project, trim
+from formats import render_collection, setup_json
+from favorites import insert_favorites, favorites_cli
+from groupcommit import favorite_writes
+from changes import record_changes, changes_since, parse_position
+from batch import read_batch, run_batch
+from conditional import conditional_collection, add_body_etag
 from models import db, User, Favorite, Planet, Character
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
+# Perfiles de arranque: "api" no carga admin, migraciones ni swagger
+PROFILES = {
+    "full": {"ADMIN": True, "MIGRATE": True, "SWAGGER": True},
+    "development": {"ADMIN": True, "MIGRATE": True, "SWAGGER": True},
+    "production": {"ADMIN": True, "MIGRATE": True, "SWAGGER": True},
+    "api": {"ADMIN": False, "MIGRATE": False, "SWAGGER": False},
+}
+
+api = Blueprint('api', __name__)
 
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
-        "postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db.init_app(app)
-migrate = Migrate(app, db)
-CORS(app)
-setup_admin(app)
+@api.after_app_request
+def etag_response(response):
+    return add_body_etag(response)
 
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
 
 # generate sitemap with all your endpoints
-@app.route('/')
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
+
+
+# Contadores del cache de people/planets para poder dimensionarlo
+
+
+@api.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = cache.stats()
+    stats["compressed"] = compressed_cache.stats()
+    return jsonify(stats), 200
+
+
+# Contadores del rate limiting de este worker
+
+
+@api.route('/ratelimit/stats', methods=['GET'])
+def rate_limit_stats():
+    return jsonify(limiter.stats()), 200
+
+
+# Estado del pool de conexiones de este worker
+
+
+@api.route('/pool/stats', methods=['GET'])
+def get_pool_stats():
+    status = pool_status()
+    if 'replicas' in current_app.extensions:
+        status['replicas'] = current_app.extensions['replicas'].status()
+    status['group_commit'] = favorite_writes.stats()
+    return jsonify(status), 200
 
 
 #                                                                   METODOS GET
@@ -41,64 +87,143 @@ def sitemap():
 # Endpoint para obtener todos los users y users ID
 
 
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
+@api.route('/users/<int:user_id>', methods=['GET'])
+@limiter.limit(cost=5, expensive=True)
+@conditional_collection(User, Favorite)
 def get_users(user_id=None):
+    fields = requested_fields(User)
     if user_id is not None:
-        user = User.query.get(user_id)
+        user = User.query.options(selectinload(User.favorites)).get(user_id)
         if user is None:
             return jsonify({"msg": "User not found"}), 404
-        return jsonify(user.serialize()), 200
-    users = User.query.all()
-    users = list(map(lambda user: user.serialize(), users))
-    return jsonify(users), 200
+        return jsonify(trim(user.serialize(), fields)), 200
+    if fields is not None:
+        query, serialize = project(User.query, User, fields)
+    else:
+        # Load favorites for every user of the page in one extra query (no N+1)
+        query = User.query.options(selectinload(User.favorites))
+        serialize = User.serialize
+    if wants_stream():
+        return stream_response(query.order_by(User.id), serialize)
+    users, next_cursor = paginate(query, User.id)
+    users = list(map(serialize, users))
+    return add_pagination_headers(render_collection(users), next_cursor), 200
 
 
 # Endpoint para obtener /users/favorites
 
 
-@app.route('/users/favorites', methods=['GET'])
+@api.route('/users/favorites', methods=['GET'])
+@limiter.limit(cost=2, expensive=True)
+@conditional_collection(Favorite)
 def get_all_user_favorites():
-    favorites = Favorite.query.all()
-    favorites = list(map(lambda favorite: favorite.serialize(), favorites))
-    return jsonify(favorites), 200
+    fields = requested_fields(Favorite)
+    # Read-only listing: row tuples, no ORM objects
+    query, serialize = project(Favorite.query, Favorite, fields or Favorite.serialize_fields)
+    if wants_stream():
+        return stream_response(query.order_by(Favorite.id), serialize)
+    favorites, next_cursor = paginate(query, Favorite.id)
+    favorites = list(map(serialize, favorites))
+    return add_pagination_headers(render_collection(favorites), next_cursor), 200
+
+
+# Endpoint para obtener los favoritos de un usuario con el planeta/personaje completo
+
+
+@api.route('/users/<int:user_id>/favorites', methods=['GET'])
+@limiter.limit(cost=2)
+# Planet/Character are not scoped: any user's favorite moves the embedded
+# favorite_count, and adjust_favorite_counts bumps their updated_at
+@conditional_collection(Favorite, Planet, Character,
+                        filters=lambda user_id: {Favorite: Favorite.user_id == user_id})
+def get_user_favorites(user_id):
+    # One query: favorite LEFT JOIN planet LEFT JOIN character
+    query = Favorite.query.filter(Favorite.user_id == user_id).options(
+        joinedload(Favorite.planet), joinedload(Favorite.character))
+    favorites, next_cursor = paginate(query, Favorite.id)
+    if not favorites and db.session.get(User, user_id) is None:
+        return jsonify({"msg": "User not found"}), 404
+    favorites = list(map(lambda favorite: favorite.serialize_expanded(), favorites))
+    return add_pagination_headers(render_collection(favorites), next_cursor), 200
+
+
+# ?sort=popular: los mas favoritos primero, desde favorite_count
+
+
+def sorted_collection(query, model, serialize):
+    if request.args['sort'] != 'popular':
+        return jsonify({"msg": "Unknown sort"}), 400
+    return render_collection(list(map(serialize, popular(query, model)))), 200
 
 
 # Endpoint para obtener todos los personajes y con ID
 
 
-@app.route('/people', methods=['GET'])
-@app.route('/people/<int:character_id>', methods=['GET'])
+@api.route('/people', methods=['GET'])
+@api.route('/people/<int:character_id>', methods=['GET'])
+@conditional_collection(Character, Favorite)
 def get_characters(character_id=None):
+    fields = requested_fields(Character)
     if character_id is not None:
-        character = Character.query.get(character_id)
+        character = cache.get_entity(Character, character_id)
         if character is None:
             return jsonify({"msg": "Character not found"}), 404
-        return jsonify(character.serialize()), 200
-    characters = Character.query.all()
-    characters = list(map(lambda character: character.serialize(), characters))
-    return jsonify(characters), 200
+        return jsonify(trim(character, fields)), 200
+    query = filter_catalog(Character.query, Character)
+    query, serialize = project(query, Character, fields or Character.serialize_fields)
+    if 'sort' in request.args:
+        return sorted_collection(query, Character, serialize)
+    if wants_stream():
+        return stream_response(query.order_by(Character.id), serialize)
+    characters, next_cursor = paginate(query, Character.id)
+    characters = list(map(serialize, characters))
+    return add_pagination_headers(render_collection(characters), next_cursor), 200
 
 
 # Endpoint para obtener todos los planetas y con ID
 
 
-@app.route('/planets', methods=['GET'])
-@app.route('/planet/<int:planet_id>', methods=['GET'])
+@api.route('/planets', methods=['GET'])
+@api.route('/planet/<int:planet_id>', methods=['GET'])
+@conditional_collection(Planet, Favorite)
 def get_planets(planet_id=None):
+    fields = requested_fields(Planet)
     if planet_id is not None:
-        planet = Planet.query.get(planet_id)
+        planet = cache.get_entity(Planet, planet_id)
         if planet is None:
             return jsonify({"msg": "Planet not found"}), 404
-        return jsonify(planet.serialize()), 200
-    planets = Planet.query.all()
-    planets = list(map(lambda planet: planet.serialize(), planets))
-    return jsonify(planets), 200
+        return jsonify(trim(planet, fields)), 200
+    query = filter_catalog(Planet.query, Planet)
+    query, serialize = project(query, Planet, fields or Planet.serialize_fields)
+    if 'sort' in request.args:
+        return sorted_collection(query, Planet, serialize)
+    if wants_stream():
+        return stream_response(query.order_by(Planet.id), serialize)
+    planets, next_cursor = paginate(query, Planet.id)
+    planets = list(map(serialize, planets))
+    return add_pagination_headers(render_collection(planets), next_cursor), 200
+
+
+# Endpoint de sincronizacion: planetas, personajes y favoritos cambiados o borrados
+# desde el token ?since= (sin since devuelve todo). Pasar "next" en la siguiente llamada
+
+
+@api.route('/changes', methods=['GET'])
+def get_changes():
+    since = decode_cursor(request.args['since'], parse=parse_position) if 'since' in request.args else (0, 0)
+    limit = to_int(request.args.get('limit', MAX_PAGE_SIZE))
+    if limit is None or limit < 1:
+        return jsonify({"msg": "Invalid limit"}), 400
+    changes = changes_since(since, min(limit, MAX_PAGE_SIZE))
+    changes["next"] = encode_cursor("%d.%d" % changes["next"])
+    return jsonify(changes), 200
 
 
 #                                                                   METODOS POST
 
 
-@app.route('/users', methods=['POST'])
+@api.route('/users', methods=['POST'])
 def create_user():
     body = request.get_json()
     if 'email' not in body or 'password' not in body:
@@ -110,13 +235,14 @@ def create_user():
         new_user.last_name = body['last_name']
     db.session.add(new_user)
     db.session.commit()
+    compressed_cache.invalidate(User)
     return jsonify(new_user.serialize()), 201
 
 
 # Endpoint para crear un nuevo planeta
 
 
-@app.route('/planet', methods=['POST'])
+@api.route('/planet', methods=['POST'])
 def create_planet():
     body = request.get_json()
     if 'name' not in body:
@@ -125,14 +251,18 @@ def create_planet():
     if 'description' in body:
         new_planet.description = body['description']
     db.session.add(new_planet)
+    db.session.flush()
+    record_changes(Planet, [new_planet.id])
     db.session.commit()
+    cache.invalidate(Planet, new_planet.id)
+    compressed_cache.invalidate(Planet)
     return jsonify(new_planet.serialize()), 201
 
 
 # Endpoint para crear un nuevo character
 
 
-@app.route('/people', methods=['POST'])
+@api.route('/people', methods=['POST'])
 def create_character():
     body = request.get_json()
     if 'name' not in body:
@@ -141,10 +271,35 @@ def create_character():
     if 'description' in body:
         new_character.description = body['description']
     db.session.add(new_character)
+    db.session.flush()
+    record_changes(Character, [new_character.id])
     db.session.commit()
+    cache.invalidate(Character, new_character.id)
+    compressed_cache.invalidate(Character)
     return jsonify(new_character.serialize()), 201
 
 
+# Endpoints para crear planetas y characters en bloque (JSON array o NDJSON)
+
+
+@api.route('/planet/bulk', methods=['POST'])
+@limiter.limit(cost=10, expensive=True)
+def create_planets_bulk():
+    items = read_bulk_items()
+    results = bulk_create(Planet, items, validate_catalog_item, get_batch_size())
+    compressed_cache.invalidate(Planet)
+    return bulk_response(results)
+
+
+@api.route('/people/bulk', methods=['POST'])
+@limiter.limit(cost=10, expensive=True)
+def create_characters_bulk():
+    items = read_bulk_items()
+    results = bulk_create(Character, items, validate_catalog_item, get_batch_size())
+    compressed_cache.invalidate(Character)
+    return bulk_response(results)
+
+
 # Endpoint para crear un nuevo planeta favorito para el usuario y el ID
 """
 {
@@ -154,7 +309,7 @@ def create_character():
 """
 
 
-@app.route('/favorite/planet/<int:planet_id>', methods=['POST'])
+@api.route('/favorite/planet/<int:planet_id>', methods=['POST'])
 def add_favorite_planet(planet_id=None):
     body = request.get_json()
     if 'user_id' not in body:
@@ -174,9 +329,10 @@ def add_favorite_planet(planet_id=None):
         planet = Planet.query.get(planet_id)
         if planet is None:
             return jsonify({"msg": "Planet not found"}), 404
-    new_favorite = Favorite(user=user, planet=planet)
-    db.session.add(new_favorite)
-    db.session.commit()
+    new_favorite = favorite_writes.insert(user.id, planet_id=planet.id)
+    if new_favorite is None:
+        return jsonify({"msg": "Favorite already exists"}), 409
+    compressed_cache.invalidate(Favorite)
     return jsonify(new_favorite.serialize()), 201
 
     # Endpoint para agregar un nuevo personaje favorito al usuario y por el ID
@@ -190,7 +346,7 @@ def add_favorite_planet(planet_id=None):
 """
 
 
-@app.route('/favorite/people/<int:people_id>', methods=['POST'])
+@api.route('/favorite/people/<int:people_id>', methods=['POST'])
 def add_favorite_people(people_id=None):
     body = request.get_json()
     if 'user_id' not in body or 'character_id' not in body:
@@ -201,62 +357,181 @@ def add_favorite_people(people_id=None):
         return jsonify({"msg": "User not found"}), 404
     if character is None:
         return jsonify({"msg": "Character not found"}), 404
-    new_favorite = Favorite(user=user, character=character)
-    db.session.add(new_favorite)
-    db.session.commit()
+    new_favorite = favorite_writes.insert(user.id, character_id=character.id)
+    if new_favorite is None:
+        return jsonify({"msg": "Favorite already exists"}), 409
+    compressed_cache.invalidate(Favorite)
     return jsonify(new_favorite.serialize()), 201
 
 
+# Endpoint para crear favoritos en bloque
+"""
+[
+    {"user_id": 1, "planet_id": 5},
+    {"user_id": 1, "character_id": 3}
+]
+"""
+
+
+@api.route('/favorite/bulk', methods=['POST'])
+@limiter.limit(cost=10, expensive=True)
+def add_favorites_bulk():
+    items = read_bulk_items()
+    batch_size = get_batch_size()
+    objects = [item for item in items if isinstance(item, dict)]
+    # Resolve every referenced id with one IN query per table
+    users = existing_ids(User, [to_int(item.get('user_id')) for item in objects], batch_size)
+    planets = existing_ids(Planet, [to_int(item.get('planet_id')) for item in objects], batch_size)
+    characters = existing_ids(Character, [to_int(item.get('character_id')) for item in objects], batch_size)
+    seen = set()
+
+    def validate(item):
+        user_id = to_int(item.get('user_id'))
+        planet_id = to_int(item.get('planet_id'))
+        character_id = to_int(item.get('character_id'))
+        if user_id is None:
+            return None, ("Missing user_id field", 400)
+        if (planet_id is None) == (character_id is None):
+            return None, ("Expected one of planet_id or character_id", 400)
+        if user_id not in users:
+            return None, ("User not found", 404)
+        if planet_id is not None and planet_id not in planets:
+            return None, ("Planet not found", 404)
+        if character_id is not None and character_id not in characters:
+            return None, ("Character not found", 404)
+        if (user_id, planet_id, character_id) in seen:
+            return None, ("Duplicate favorite in batch", 409)
+        seen.add((user_id, planet_id, character_id))
+        return {"user_id": user_id, "planet_id": planet_id, "character_id": character_id}, None
+
+    results = bulk_create(Favorite, items, validate, batch_size, insert_rows=insert_favorites)
+    compressed_cache.invalidate(Favorite)
+    return bulk_response(results)
+
+
+# Endpoint para juntar varias llamadas en una: [{"method": "GET", "path": "/people/1"}, ...]
+# Devuelve [{"index", "status", "body"}] en el mismo orden
+
+
+@api.route('/batch', methods=['POST'])
+@limiter.limit(cost=0)
+def run_batch_requests():
+    requests = read_batch()
+    if limiter.enabled:
+        # Charged the summed cost of the sub-requests in one go; a batch
+        # costing more than a full bucket is rejected outright
+        cost = sum(limiter.cost(sub["endpoint"]) for sub in requests if "endpoint" in sub)
+        rejected = limiter.charge(cost, whole=True)
+        if rejected is not None:
+            return rejected
+    return jsonify(run_batch(requests)), 200
+
+
 #                                                                   METODOS DELETE
 
 # Endpoint para borrar un usuario por el ID
 
 
-@app.route('/user/<int:user_id>', methods=['DELETE'])
+@api.route('/user/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
-    user = User.query.get(user_id)
-    if user is None:
+    if delete_by_ids(User, [user_id]) == 0:
         return jsonify({"msg": "User not found"}), 404
-    db.session.delete(user)
-    db.session.commit()
+    compressed_cache.invalidate(User, Favorite)
     return jsonify({"msg": "User deleted"}), 200
 
 
 # Endpoint para borrar un planeta por el ID
 
 
-@app.route('/planet/<int:id>', methods=['DELETE'])
+@api.route('/planet/<int:id>', methods=['DELETE'])
 def delete_planet(id):
-    planet = Planet.query.get(id)
-    if planet is None:
+    if delete_by_ids(Planet, [id]) == 0:
         return jsonify({'error': 'Planet not found'}), 404
-    db.session.delete(planet)
-    db.session.commit()
+    cache.invalidate(Planet, id)
+    compressed_cache.invalidate(Planet, Favorite)
     return jsonify({'message': 'Planet deleted successfully'}), 200
 
 
 # Endpoint para borrar un character por el ID
 
 
-@app.route('/people/<int:id>', methods=['DELETE'])
+@api.route('/people/<int:id>', methods=['DELETE'])
 def delete_character(id):
-    character = Character.query.get(id)
-    if character is None:
+    if delete_by_ids(Character, [id]) == 0:
         return jsonify({'error': 'Character not found'}), 404
-    db.session.delete(character)
-    db.session.commit()
+    cache.invalidate(Character, id)
+    compressed_cache.invalidate(Character, Favorite)
     return jsonify({'message': 'Character deleted successfully'}), 200
 
 
+# Endpoints para borrar en bloque: DELETE /users?ids=1,2,3 (igual /planets y /people)
+
+
+@api.route('/users', methods=['DELETE'])
+@limiter.limit(cost=5)
+def delete_users_bulk():
+    if 'ids' not in request.args:
+        return jsonify({"msg": "Missing ids parameter"}), 400
+    deleted = delete_by_ids(User, parse_ids(request.args['ids']))
+    compressed_cache.invalidate(User, Favorite)
+    return jsonify({"deleted": deleted}), 200
+
+
+@api.route('/planets', methods=['DELETE'])
+@limiter.limit(cost=5)
+def delete_planets_bulk():
+    if 'ids' not in request.args:
+        return jsonify({"msg": "Missing ids parameter"}), 400
+    ids = parse_ids(request.args['ids'])
+    deleted = delete_by_ids(Planet, ids)
+    for id in ids:
+        cache.invalidate(Planet, id)
+    compressed_cache.invalidate(Planet, Favorite)
+    return jsonify({"deleted": deleted}), 200
+
+
+@api.route('/people', methods=['DELETE'])
+@limiter.limit(cost=5)
+def delete_characters_bulk():
+    if 'ids' not in request.args:
+        return jsonify({"msg": "Missing ids parameter"}), 400
+    ids = parse_ids(request.args['ids'])
+    deleted = delete_by_ids(Character, ids)
+    for id in ids:
+        cache.invalidate(Character, id)
+    compressed_cache.invalidate(Character, Favorite)
+    return jsonify({"deleted": deleted}), 200
+
+
+# Con user_id (query o body) se borra solo el favorito de ese usuario;
+# sin el, se borra el personaje/planeta como antes
+
+
+def favorite_owner():
+    body = request.get_json(silent=True) or {}
+    user_id = request.args.get('user_id', body.get('user_id') if isinstance(body, dict) else None)
+    if user_id is None:
+        return None
+    user_id = to_int(user_id)
+    if user_id is None:
+        raise APIException("Invalid user_id", status_code=400)
+    return user_id
+
+
 # Endpoint para eliminar un character como favorito
 
 
-@app.route('/favorite/people/<int:character_id>', methods=['DELETE'])
+@api.route('/favorite/people/<int:character_id>', methods=['DELETE'])
 def delete_favorite_character(character_id):
-    character = Character.query.get(character_id)
-    if character:
-        db.session.delete(character)
-        db.session.commit()
+    user_id = favorite_owner()
+    if user_id is not None:
+        if not favorite_writes.delete(user_id, character_id=character_id):
+            return jsonify({"msg": "Favorite not found"}), 404
+        compressed_cache.invalidate(Favorite)
+        return jsonify({"success": True}), 200
+    if delete_by_ids(Character, [character_id]):
+        cache.invalidate(Character, character_id)
+        compressed_cache.invalidate(Character, Favorite)
         return jsonify({"success": True}), 200
     else:
         return jsonify({"error": "Character not found"}), 404
@@ -265,16 +540,100 @@ def delete_favorite_character(character_id):
 # Endpoint para eliminar un planeta como favorito
 
 
-@app.route('/favorite/planet/<int:planet_id>', methods=['DELETE'])
+@api.route('/favorite/planet/<int:planet_id>', methods=['DELETE'])
 def ddelete_favorite_(planet_id):
-    planet = Planet.query.get(planet_id)
-    if planet is None:
+    user_id = favorite_owner()
+    if user_id is not None:
+        if not favorite_writes.delete(user_id, planet_id=planet_id):
+            return jsonify({"msg": "Favorite not found"}), 404
+        compressed_cache.invalidate(Favorite)
+        return jsonify({"msg": "Favorite deleted"}), 200
+    if delete_by_ids(Planet, [planet_id]) == 0:
         return jsonify({"msg": "Planet not found"}), 404
-    db.session.delete(planet)
-    db.session.commit()
+    cache.invalidate(Planet, planet_id)
+    compressed_cache.invalidate(Planet, Favorite)
     return jsonify({"msg": "Planet deleted"}), 200
 
 
+def create_app(config=None):
+    """Build the Flask app.
+
+    config is a profile name from PROFILES (default APP_PROFILE or "full")
+    or a dict of config values, which may include a "PROFILE" key. Admin,
+    migrations and swagger are only imported when the profile enables them.
+    """
+    if not isinstance(config, dict):
+        config = {"PROFILE": config}
+    profile = config.get("PROFILE") or os.getenv("APP_PROFILE", "full")
+    if profile not in PROFILES:
+        raise ValueError("Unknown profile %r" % profile)
+
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    # Render/Heroku put one proxy in front of the app: take the client
+    # address from X-Forwarded-For so the rate limiter doesn't see every
+    # client as the proxy. Set TRUSTED_PROXY_HOPS=0 when clients connect
+    # directly, the header can be forged then
+    app.config['TRUSTED_PROXY_HOPS'] = int(os.getenv("TRUSTED_PROXY_HOPS", 1))
+    if app.config['TRUSTED_PROXY_HOPS']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'])
+    setup_json(app)
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
+            "postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['METRICS'] = os.getenv("METRICS_ENABLED", "1") != "0"
+    app.config.update(PROFILES[profile])
+    app.config.update(config)
+    app.config['PROFILE'] = profile
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    setup_pool(app)
+    setup_replicas(app, engine_options)
+    CORS(app)
+    cache.init_app(app)
+    if app.config['METRICS']:
+        setup_metrics(app, performance_gauges)
+    # After metrics so rejected requests are still counted
+    limiter.init_app(app)
+    favorite_writes.init_app(app)
+    # Registered before the blueprint so it runs after the ETag hook
+    setup_compression(app)
+    app.register_blueprint(api)
+    app.cli.add_command(snapshot_cli)
+    app.cli.add_command(favorites_cli)
+
+    if app.config['MIGRATE']:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    if app.config['ADMIN']:
+        from admin import setup_admin
+        setup_admin(app)
+    if app.config['SWAGGER']:
+        setup_swagger(app)
+    return app
+
+
+def performance_gauges():
+    gauges = {"db_pool_" + key: value for key, value in pool_status().items()}
+    gauges.update({"entity_cache_" + key: value for key, value in cache.stats().items()})
+    return gauges
+
+
+def setup_swagger(app):
+    @app.route('/swagger.json', methods=['GET'])
+    def swagger_spec():
+        from flask_swagger import swagger
+        return jsonify(swagger(app)), 200
+
+
+app = create_app()
+
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
     app.run(host='0.0.0.0', port=PORT, debug=False)
@@ -0,0 +1,338 @@
+# ASGI entry point, the async counterpart of wsgi.py:
+#
+#   gunicorn asgi:application -k uvicorn.workers.UvicornWorker --chdir ./src/
+#
+# The read endpoints (GET /people, /planets, /users, /users/favorites and
+# their by-id variants, with ?limit/?after and If-None-Match) are answered
+# natively with SQLAlchemy's asyncio engine (asyncpg / aiosqlite), so a slow
+# query only parks a coroutine. Every other request, and reads using any
+# other option, runs the regular Flask app in a thread pool.
+import os
+import sys
+import math
+import asyncio
+import hashlib
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_etags, parse_accept_header, parse_list_header
+from app import app as flask_app
+from pool import engine_options, TimedQueuePool
+from compression import available_encodings, compress, compressed_cache
+from ratelimit import limiter
+from utils import APIException, MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from models import User, Favorite, Planet, Character
+
+# endpoint -> (model, id argument, not found message, tables behind the collection ETag)
+ROUTES = {
+    "api.get_planets": (Planet, "planet_id", "Planet not found", (Planet, Favorite)),
+    "api.get_characters": (Character, "character_id", "Character not found", (Character, Favorite)),
+    "api.get_users": (User, "user_id", "User not found", (User, Favorite)),
+    "api.get_all_user_favorites": (Favorite, None, None, (Favorite,)),
+}
+NATIVE_ARGS = {"limit", "after"}
+
+
+def async_database_url(url):
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def async_engine_options(db_url):
+    # The sync engine's options from pool.py, adapted to the asyncio drivers
+    options = engine_options(db_url)
+    if options.get("poolclass") is TimedQueuePool:
+        # A sync QueuePool can't back an async engine, keep its default
+        # AsyncAdaptedQueuePool with the same size/overflow/timeout/recycle
+        del options["poolclass"]
+    if "connect_args" in options:
+        # asyncpg takes server settings instead of libpq's -c options
+        statement_timeout = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(int(statement_timeout))}}
+    return options
+
+
+def build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/%s" % scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = "HTTP_" + name
+        environ[key] = environ[key] + "," + value if key in environ else value
+    return environ
+
+
+class AsyncAPI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.urls = flask_app.url_map.bind("localhost")
+        db_url = flask_app.config["SQLALCHEMY_DATABASE_URI"]
+        self.engine = create_async_engine(async_database_url(db_url), **async_engine_options(db_url))
+        self.executor = ThreadPoolExecutor(max_workers=int(os.getenv("ASGI_WSGI_THREADS", 8)))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        route = self.match(scope) if scope["type"] == "http" else None
+        if route is None:
+            return await self.call_wsgi(scope, receive, send)
+        rejected = self.admit(scope, *route)
+        if rejected is not None:
+            status, headers, body = rejected
+        else:
+            status, headers, body = await self.handle(scope, *route)
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (name.encode("latin1"), value.encode("latin1")) for name, value in headers]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def match(self, scope):
+        if scope["method"] != "GET":
+            return None
+        query = parse_qsl(scope["query_string"].decode("latin1"), keep_blank_values=True)
+        if any(key not in NATIVE_ARGS for key, _ in query):
+            return None
+        headers = {name.decode("latin1").lower(): value.decode("latin1") for name, value in scope["headers"]}
+        accept = headers.get("accept", "")
+        if any(kind in accept for kind in ("ndjson", "msgpack", "columnar")):
+            return None
+        try:
+            endpoint, args = self.urls.match(scope["path"], method="GET")
+        except HTTPException:
+            return None
+        if endpoint not in ROUTES:
+            return None
+        return endpoint, args, query, headers
+
+    def admit(self, scope, endpoint, args, query, headers):
+        # Same token buckets as ratelimit.RateLimiter.admit; the concurrency
+        # cap doesn't apply here, a waiting query only parks a coroutine
+        if not limiter.enabled:
+            return None
+        cost = getattr(self.flask_app.view_functions[endpoint], "rate_limit_cost", 1)
+        key = limiter.bucket_key(headers.get("x-api-key"), self.client_address(scope, headers))
+        allowed, retry_after = limiter.store.take(key, min(cost, limiter.burst), limiter.rate, limiter.burst)
+        if allowed:
+            return None
+        limiter.rejected += 1
+        status, response_headers, body = self.json(429, {"msg": "Too many requests"}, [])
+        return status, response_headers + [("Retry-After", str(max(1, math.ceil(retry_after))))], body
+
+    def client_address(self, scope, headers):
+        # What ProxyFix(x_for=TRUSTED_PROXY_HOPS) resolves on the Flask side
+        hops = self.flask_app.config["TRUSTED_PROXY_HOPS"]
+        forwarded = parse_list_header(headers.get("x-forwarded-for", ""))
+        if hops and len(forwarded) >= hops:
+            return forwarded[-hops]
+        return (scope.get("client") or ("",))[0]
+
+    async def handle(self, scope, endpoint, args, query, headers):
+        model, id_arg, not_found, etag_models = ROUTES[endpoint]
+        base_headers = []
+        if "origin" in headers:
+            base_headers.append(("Access-Control-Allow-Origin", "*"))
+        id = args.get(id_arg) if id_arg is not None else None
+        async with self.engine.connect() as conn:
+            if id is not None:
+                rows = await self.fetch(conn, model, where=model.__table__.c.id == id)
+                if not rows:
+                    return self.json(404, {"msg": not_found}, base_headers)
+                body = self.dumps(rows[0])
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                status, response_headers, body = self.conditional(headers, etag, body, base_headers)
+                if status != 200:
+                    return status, response_headers, body
+                return self.compress(headers, status, response_headers, body)
+
+            etag = await self.collection_etag(conn, etag_models, scope, headers)
+            if_none_match = parse_etags(headers.get("if-none-match"))
+            if if_none_match.contains_weak(etag.strip('"')):
+                return 304, base_headers + [("ETag", self.sent_etag(if_none_match, etag))], b""
+            try:
+                limit, after = self.page_args(dict(query))
+            except APIException as error:
+                return self.json(error.status_code, error.to_dict(), base_headers)
+            rows = await self.fetch(conn, model, after=after, limit=limit + 1 if limit else None)
+
+        response_headers = base_headers + [("ETag", etag), ("Vary", "Accept")]
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            cursor = encode_cursor(rows[-1]["id"])
+            params = dict(query)
+            params["after"] = cursor
+            host = headers.get("host", "localhost")
+            next_url = "%s://%s%s?%s" % (scope.get("scheme", "http"), host, scope["path"], urlencode(params))
+            response_headers += [("Link", '<%s>; rel="next"' % next_url), ("X-Next-Cursor", cursor)]
+        tables = [model.__tablename__ for model in etag_models]
+        return self.compress(headers, *self.json(200, rows, response_headers), etag=etag.strip('"'), tables=tables)
+
+    def page_args(self, params):
+        after = decode_cursor(params["after"]) if "after" in params else None
+        limit = params.get("limit")
+        if limit is None:
+            return None, after
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise APIException("Invalid limit", status_code=400)
+        if limit < 1:
+            raise APIException("Invalid limit", status_code=400)
+        return min(limit, MAX_PAGE_SIZE), after
+
+    async def fetch(self, conn, model, where=None, after=None, limit=None):
+        table = model.__table__
+        columns = [table.c[field] for field in model.serialize_fields if field in table.c]
+        stmt = select(*columns).order_by(table.c.id)
+        if where is not None:
+            stmt = stmt.where(where)
+        if after is not None:
+            stmt = stmt.where(table.c.id > after)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        rows = [dict(row._mapping) for row in await conn.execute(stmt)]
+        if model is User and rows:
+            # Same batching as the selectinload in get_users: one query per page
+            favorite = Favorite.__table__
+            by_user = {row["id"]: [] for row in rows}
+            for row in rows:
+                row["favorites"] = by_user[row["id"]]
+            result = await conn.execute(select(*[favorite.c[field] for field in Favorite.serialize_fields])
+                                        .where(favorite.c.user_id.in_(list(by_user))))
+            for favorite_row in result:
+                by_user[favorite_row.user_id].append(dict(favorite_row._mapping))
+        return rows
+
+    async def collection_etag(self, conn, models, scope, headers):
+        # Must match conditional.collection_etag so both servers agree
+        parts = []
+        for model in models:
+            table = model.__table__
+            count, max_id, updated_at = (await conn.execute(select(
+                func.count(table.c.id), func.max(table.c.id), func.max(table.c.updated_at)))).one()
+            parts.append("%s:%s:%s:%s" % (table.name, count, max_id, updated_at))
+        parts.append(scope["path"] + "?" + scope["query_string"].decode("latin1"))
+        parts.append(headers.get("accept", ""))
+        return '"%s"' % hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+    def sent_etag(self, if_none_match, etag):
+        # Same as compress_response: a client holding W/"<etag>" gets it back
+        return "W/" + etag if if_none_match.is_weak(etag.strip('"')) else etag
+
+    def conditional(self, headers, etag, body, base_headers):
+        if_none_match = parse_etags(headers.get("if-none-match"))
+        if if_none_match.contains_weak(etag.strip('"')):
+            return 304, base_headers + [("ETag", self.sent_etag(if_none_match, etag))], b""
+        return 200, base_headers + [("Content-Type", "application/json"), ("ETag", etag),
+                                    ("Content-Length", str(len(body)))], body
+
+    def compress(self, request_headers, status, headers, body, etag=None, tables=()):
+        # Same negotiation, threshold and cache as compression.setup_compression
+        config = self.flask_app.config
+        vary = ", ".join([value for name, value in headers if name == "Vary"] + ["Accept-Encoding"])
+        headers = [(name, value) for name, value in headers if name not in ("Content-Length", "Vary")]
+        headers.append(("Vary", vary))
+        encoding = parse_accept_header(request_headers.get("accept-encoding")).best_match(available_encodings())
+        if encoding is None or len(body) < config["COMPRESS_MIN_SIZE"]:
+            return status, headers + [("Content-Length", str(len(body)))], body
+        compressed = compressed_cache.get(etag, encoding) if tables else None
+        if compressed is None:
+            compressed = compress(body, encoding, config)
+            if tables and compressed_cache.max_bytes:
+                compressed_cache.set(etag, encoding, compressed, tables)
+        # The compressed bytes only share a weak validator with the identity body
+        headers = [(name, "W/" + value if name == "ETag" and not value.startswith("W/") else value)
+                   for name, value in headers]
+        return status, headers + [("Content-Encoding", encoding),
+                                  ("Content-Length", str(len(compressed)))], compressed
+
+    def dumps(self, data):
+        # Encode exactly like jsonify so bodies and ETags match the WSGI app
+        with self.flask_app.app_context():
+            return self.flask_app.json.response(data).get_data()
+
+    def json(self, status, data, headers):
+        body = self.dumps(data)
+        return status, headers + [("Content-Type", "application/json"),
+                                  ("Content-Length", str(len(body)))], body
+
+    async def call_wsgi(self, scope, receive, send):
+        """Run the Flask app in the thread pool, streaming its body back."""
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        environ = build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def start_response(status, headers, exc_info=None):
+            loop.call_soon_threadsafe(queue.put_nowait, ("start", int(status.split(" ", 1)[0]), headers))
+
+        def run():
+            # The whole WSGI iteration stays on one thread, as Flask expects
+            try:
+                result = self.flask_app(environ, start_response)
+                try:
+                    for chunk in result:
+                        if chunk:
+                            loop.call_soon_threadsafe(queue.put_nowait, ("body", chunk))
+                finally:
+                    if hasattr(result, "close"):
+                        result.close()
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, ("end",))
+
+        future = loop.run_in_executor(self.executor, run)
+        while True:
+            message = await queue.get()
+            if message[0] == "start":
+                await send({"type": "http.response.start", "status": message[1], "headers": [
+                    (name.encode("latin1"), value.encode("latin1")) for name, value in message[2]]})
+            elif message[0] == "body":
+                await send({"type": "http.response.body", "body": message[1], "more_body": True})
+            else:
+                break
+        await future
+        await send({"type": "http.response.body", "body": b""})
+
+
+application = AsyncAPI(flask_app)
@@ -0,0 +1,135 @@
+import os
+from flask import current_app, request, g
+from sqlalchemy.orm import selectinload
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from utils import APIException
+from cache import cache
+from models import db, User, Planet, Character
+
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 100))
+
+# By-id GET endpoints whose rows are loaded up front with one IN query per
+# model: endpoint -> (model, id argument, loader options)
+LOADERS = {
+    "api.get_planets": (Planet, "planet_id", ()),
+    "api.get_characters": (Character, "character_id", ()),
+    "api.get_users": (User, "user_id", (selectinload(User.favorites),)),
+}
+
+# Headers of the batch request passed on to every sub-request
+FORWARDED_HEADERS = ("Accept", "Accept-Language", "Authorization", "X-API-Key")
+
+
+def read_batch():
+    """Validate the POST /batch body: a list of {"method", "path", "body"}."""
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        raise APIException("Expected a JSON array", status_code=400)
+    if len(items) > BATCH_MAX_REQUESTS:
+        raise APIException("At most %d requests per batch" % BATCH_MAX_REQUESTS, status_code=400)
+    adapter = current_app.url_map.bind("localhost")
+    requests = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str) \
+                or not item["path"].startswith("/"):
+            requests.append({"index": index, "error": ("Expected an object with a path", 400)})
+            continue
+        method = str(item.get("method", "GET")).upper()
+        path = item["path"]
+        try:
+            endpoint, args = adapter.match(path.split("?", 1)[0], method=method)
+        except HTTPException as error:
+            requests.append({"index": index, "error": (error.description, error.code)})
+            continue
+        if endpoint == "api.run_batch_requests":
+            requests.append({"index": index, "error": ("Batches can't be nested", 400)})
+            continue
+        requests.append({"index": index, "method": method, "path": path, "endpoint": endpoint,
+                         "args": args, "body": item.get("body")})
+    return requests
+
+
+def prime(requests):
+    """Load every row the by-id GETs will ask for, one IN query per model.
+
+    The rows stay in the session's identity map (the returned list keeps
+    them alive), so the handlers' Model.query.get() finds them without SQL.
+    """
+    ids = {}
+    for sub in requests:
+        if sub.get("method") == "GET" and sub["endpoint"] in LOADERS:
+            model, argument, _ = LOADERS[sub["endpoint"]]
+            if sub["args"].get(argument) is not None:
+                ids.setdefault(sub["endpoint"], set()).add(sub["args"][argument])
+    loaded = []
+    for endpoint, wanted in ids.items():
+        model, _, options = LOADERS[endpoint]
+        loaded.extend(model.query.options(*options).filter(model.id.in_(wanted)).all())
+    return loaded
+
+
+def dispatch(sub):
+    """Run one sub-request through the regular view and error handlers."""
+    headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+    builder = EnvironBuilder(path=sub["path"], method=sub["method"], headers=headers,
+                             json=sub["body"] if sub["body"] is not None else None,
+                             environ_base={"REMOTE_ADDR": request.remote_addr or ""})
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+    with current_app.request_context(environ):
+        try:
+            response = current_app.make_response(current_app.dispatch_request())
+        except Exception as error:
+            try:
+                response = current_app.make_response(current_app.handle_user_exception(error))
+            except Exception:
+                current_app.logger.exception("Error in batch sub-request %s %s", sub["method"], sub["path"])
+                return 500, {"msg": "Internal server error"}
+        try:
+            body = response.get_json(silent=True) if response.is_json else response.get_data(as_text=True)
+        finally:
+            # Runs the call_on_close callbacks, e.g. frees a concurrency slot
+            response.close()
+        return response.status_code, body
+
+
+def run_batch(requests):
+    """Execute the sub-requests in order, in one transaction.
+
+    Each sub-request, reads included, runs in a SAVEPOINT, so a failing one
+    is rolled back alone (on Postgres a failed statement would otherwise
+    abort the whole transaction) and the others commit together at the end.
+    """
+    results = []
+    loaded = prime(requests)  # noqa: F841, holds the primed rows
+    # Reads must see the batch's own uncommitted writes, never a replica
+    g.read_primary = True
+    g.deferred_invalidations = []
+    db.session.info["batch"] = True
+    try:
+        for sub in requests:
+            if "error" in sub:
+                msg, status = sub["error"]
+                results.append({"index": sub["index"], "status": status, "body": {"msg": msg}})
+                continue
+            savepoint = db.session.begin_nested()
+            status, body = dispatch(sub)
+            if status >= 500:
+                savepoint.rollback()
+            else:
+                savepoint.commit()
+            if sub["method"] != "GET":
+                # Primed rows may be stale now, later reads reload them
+                db.session.expire_all()
+            results.append({"index": sub["index"], "status": status, "body": body})
+        db.session.info.pop("batch")
+        db.session.commit()
+    finally:
+        db.session.info.pop("batch", None)
+    pending, g.deferred_invalidations = g.deferred_invalidations, None
+    for model, id in pending:
+        cache.invalidate(model, id)
+    return results
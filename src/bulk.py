@@ -0,0 +1,137 @@
+import os
+from flask import request, json, jsonify
+from sqlalchemy import insert, delete
+from utils import APIException, NDJSON_MIMETYPE
+from models import db, User, Favorite
+from changes import record_changes, cascaded_favorites
+from favorites import adjust_favorite_counts, invalidate_counts
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+MAX_BULK_BATCH_SIZE = 10000
+
+
+def read_bulk_items():
+    """Read the request body as a JSON array or as NDJSON (one object per line)."""
+    if request.mimetype == NDJSON_MIMETYPE:
+        items = []
+        for number, line in enumerate(request.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise APIException("Invalid JSON on line %d" % number, status_code=400)
+        return items
+    body = request.get_json(silent=True)
+    if not isinstance(body, list):
+        raise APIException("Expected a JSON array", status_code=400)
+    return body
+
+
+def get_batch_size():
+    batch_size = request.args.get("batch_size", BULK_BATCH_SIZE)
+    try:
+        batch_size = int(batch_size)
+    except ValueError:
+        raise APIException("Invalid batch_size", status_code=400)
+    if batch_size < 1:
+        raise APIException("Invalid batch_size", status_code=400)
+    return min(batch_size, MAX_BULK_BATCH_SIZE)
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def existing_ids(model, ids, batch_size):
+    # One IN query per type, split so we stay under the driver's bind limit
+    ids = sorted(set(id for id in ids if id is not None))
+    found = set()
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        found.update(db.session.scalars(db.select(model.id).where(model.id.in_(chunk))))
+    return found
+
+
+def bulk_insert(model, rows, batch_size):
+    # executemany with RETURNING, ids come back in the same order as rows
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    ids = []
+    for start in range(0, len(rows), batch_size):
+        result = db.session.execute(stmt, rows[start:start + batch_size])
+        batch_ids = result.scalars().all()
+        record_changes(model, batch_ids)
+        ids.extend(batch_ids)
+    db.session.commit()
+    return ids
+
+
+def delete_by_ids(model, ids):
+    """DELETE ... WHERE id IN (...) without loading the rows.
+
+    Favorites go with them through ON DELETE CASCADE; both get tombstones
+    in the change log. Returns the number of deleted rows.
+    """
+    favorites = cascaded_favorites(model, ids)
+    deleted = db.session.scalars(delete(model).where(model.id.in_(ids)).returning(model.id)).all()
+    record_changes(Favorite, [favorite.id for favorite in favorites], deleted=True)
+    record_changes(model, deleted, deleted=True)
+    # A deleted user's favorites no longer count for their planets/characters
+    touched = adjust_favorite_counts(favorites, -1) if model is User else []
+    db.session.commit()
+    invalidate_counts(touched)
+    return len(deleted)
+
+
+def bulk_create(model, items, validate, batch_size, insert_rows=None):
+    """Validate every item, insert the valid ones and return one result per item.
+
+    validate(item) returns (row, None) or (None, (msg, status_code)).
+    insert_rows(rows, batch_size) replaces the default insert and may return
+    None for rows that were skipped as duplicates.
+    """
+    results = [None] * len(items)
+    rows = []
+    indexes = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            row, error = None, ("Expected a JSON object", 400)
+        else:
+            row, error = validate(item)
+        if error is not None:
+            results[index] = {"index": index, "status": error[1], "msg": error[0]}
+        else:
+            rows.append(row)
+            indexes.append(index)
+    if insert_rows is None:
+        def insert_rows(rows, batch_size):
+            return bulk_insert(model, rows, batch_size)
+    ids = insert_rows(rows, batch_size) if rows else []
+    for index, id in zip(indexes, ids):
+        if id is None:
+            results[index] = {"index": index, "status": 409, "msg": "Already exists"}
+        else:
+            results[index] = {"index": index, "status": 201, "id": id}
+    return results
+
+
+def bulk_response(results):
+    # 207 Multi-Status when at least one item was rejected
+    status = 201 if all(result["status"] == 201 for result in results) else 207
+    return jsonify(results), status
+
+
+def validate_catalog_item(item):
+    name = item.get("name")
+    description = item.get("description")
+    if not isinstance(name, str) or not name:
+        return None, ("Missing name field", 400)
+    if len(name) > 250:
+        return None, ("name is too long", 400)
+    if description is not None and (not isinstance(description, str) or len(description) > 1000):
+        return None, ("Invalid description field", 400)
+    return {"name": name, "description": description}, None
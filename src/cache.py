@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from flask import g, has_app_context
+
+
+class LRUCache:
+    """In-process LRU cache with a per-entry TTL and a max number of entries.
+
+    Each gunicorn worker has its own copy and a write only invalidates the
+    copy of the worker that handled it, so the others may serve the old row
+    (favorite_count included) for up to the TTL.
+    """
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """Cache entries stored as JSON in Redis, expired by Redis after ttl seconds.
+
+    All workers read and invalidate the same keys, so a write is seen by
+    every worker at once.
+    """
+
+    def __init__(self, url, ttl=60, prefix="swapi:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, json.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def entity_key(model, id):
+    return "%s:%s" % (model.__tablename__, id)
+
+
+class EntityCache:
+    """Read-through cache of serialized rows, invalidated by the write handlers.
+
+    backend is anything with get/set/delete/clear; by default init_app
+    picks RedisCache or LRUCache from the environment.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else LRUCache()
+        # A backend given here is kept by init_app
+        self._backend_injected = backend is not None
+        self.hits = 0
+        self.misses = 0
+        # Counters are bumped from every request thread
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app):
+        if not self._backend_injected:
+            ttl = int(os.getenv("CACHE_TTL", 60))
+            redis_url = os.getenv("CACHE_REDIS_URL")
+            if redis_url is not None:
+                self.backend = RedisCache(redis_url, ttl=ttl)
+            else:
+                self.backend = LRUCache(int(os.getenv("CACHE_MAX_ENTRIES", 1024)), ttl=ttl)
+        app.extensions["entity_cache"] = self
+
+    def get_entity(self, model, id):
+        key = entity_key(model, id)
+        value = self.backend.get(key)
+        if value is not None:
+            with self._stats_lock:
+                self.hits += 1
+            return value
+        with self._stats_lock:
+            self.misses += 1
+        row = self.load(model, id)
+        if row is None:
+            return None
+        value = row.serialize()
+        self.backend.set(key, value)
+        return value
+
+    def load(self, model, id):
+        # Fill from the primary: a lagging replica would put back the row a
+        # write just invalidated, and keep it for CACHE_TTL
+        if not has_app_context():
+            return model.query.get(id)
+        read_primary = g.get("read_primary")
+        g.read_primary = True
+        try:
+            return model.query.get(id)
+        finally:
+            g.read_primary = read_primary
+
+    def invalidate(self, model, id):
+        self.backend.delete(entity_key(model, id))
+        if has_app_context() and g.get("deferred_invalidations") is not None:
+            # Inside POST /batch: invalidate again once the transaction commits
+            g.deferred_invalidations.append((model, id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else None
+        }
+
+
+cache = EntityCache()
@@ -0,0 +1,106 @@
+import os
+from datetime import timedelta
+from sqlalchemy import insert, delete, select, func, cast, tuple_, Text, BigInteger
+from models import db, utcnow, Change, User, Planet, Character, Favorite
+
+# Tables in the feed and the key they are returned under
+FEEDS = {Planet: "planets", Character: "people", Favorite: "favorites"}
+
+# Favorite column that ON DELETE CASCADE follows from each parent table
+CASCADES = {User: Favorite.user_id, Planet: Favorite.planet_id, Character: Favorite.character_id}
+
+
+def record_changes(model, ids, deleted=False):
+    """Log rows of model as written (or deleted) in the caller's transaction.
+
+    Older entries of the same rows are dropped, so the log grows with the
+    number of rows rather than with the number of writes.
+    """
+    ids = [id for id in ids if id is not None]
+    if model not in FEEDS or not ids:
+        return
+    table = model.__tablename__
+    db.session.execute(delete(Change).where(Change.table_name == table, Change.row_id.in_(ids)))
+    now = utcnow()
+    db.session.execute(insert(Change).values(txid=current_txid()), [
+        {"table_name": table, "row_id": id, "deleted": deleted, "changed_at": now} for id in ids])
+
+
+def as_bigint(xid8):
+    return cast(cast(xid8, Text), BigInteger)
+
+
+def current_txid():
+    """Commit-order key of the change rows logged by this transaction.
+
+    Ids are handed out when a transaction inserts its change rows, not when
+    it commits, so on Postgres a later id can become visible first. Rows
+    carry the Postgres transaction id instead and the feed is ordered by
+    (txid, id). SQLite runs one writer at a time, so its ids are already in
+    commit order and every row gets 0.
+    """
+    if db.engine.dialect.name == "postgresql":
+        return as_bigint(func.pg_current_xact_id())
+    return 0
+
+
+def parse_position(token):
+    # "txid.id"; tokens from before txid existed are a bare id
+    txid, _, id = token.rpartition(".")
+    return int(txid or 0), int(id)
+
+
+def cascaded_favorites(model, ids):
+    # Favorites the database will delete along with these rows; read them
+    # before the DELETE so they get tombstones (and counts) too
+    if model not in CASCADES:
+        return []
+    return db.session.execute(select(Favorite.id, Favorite.planet_id, Favorite.character_id)
+                              .where(CASCADES[model].in_(ids))).all()
+
+
+def settle_window():
+    """How old a change must be before the feed returns it.
+
+    Only for backends other than Postgres and SQLite, which have no
+    transaction ids to order by: holding back the last CHANGES_SETTLE_MS
+    (default 1000) keeps a client from skipping past a transaction that is
+    still committing.
+    """
+    default = 0 if db.engine.dialect.name in ("postgresql", "sqlite") else 1000
+    return timedelta(milliseconds=int(os.getenv("CHANGES_SETTLE_MS", default)))
+
+
+def changes_since(since, limit):
+    """Rows written and deleted after position since, oldest first.
+
+    since and the returned next are (txid, id) pairs. Returns the current
+    data of written rows (one IN query per table), the ids of deleted ones,
+    the position to pass next time and whether more changes are waiting.
+    """
+    query = select(Change).where(tuple_(Change.txid, Change.id) > tuple_(*since))
+    if db.engine.dialect.name == "postgresql":
+        # Every transaction below the snapshot's xmin has ended, so no row
+        # with a lower txid can become visible later and next never moves
+        # past a transaction still in flight
+        query = query.where(Change.txid < as_bigint(func.pg_snapshot_xmin(func.pg_current_snapshot())))
+    window = settle_window()
+    if window:
+        query = query.where(Change.changed_at <= utcnow() - window)
+    entries = db.session.scalars(query.order_by(Change.txid, Change.id).limit(limit + 1)).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    data = {key: [] for key in FEEDS.values()}
+    data["deleted"] = {key: [] for key in FEEDS.values()}
+    for model, key in FEEDS.items():
+        table = model.__tablename__
+        written = [entry.row_id for entry in entries if entry.table_name == table and not entry.deleted]
+        data["deleted"][key] = [entry.row_id for entry in entries if entry.table_name == table and entry.deleted]
+        if written:
+            columns = [getattr(model, field) for field in model.serialize_fields if field in model.__table__.c]
+            rows = db.session.query(*columns).filter(model.id.in_(written)).order_by(model.id)
+            data[key] = [row._asdict() for row in rows]
+    data["next"] = (entries[-1].txid, entries[-1].id) if entries else tuple(since)
+    data["has_more"] = has_more
+    return data
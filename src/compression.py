@@ -0,0 +1,134 @@
+import os
+import gzip
+import threading
+from collections import OrderedDict
+from flask import request, g
+from formats import MSGPACK_MIMETYPE
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ("application/json", MSGPACK_MIMETYPE, "text/html", "text/plain")
+
+
+class CompressedCache:
+    """Compressed bodies of collection responses, keyed by (ETag, encoding).
+
+    The collection ETag changes whenever the tables behind it change, so an
+    entry can never be served for a different body; invalidate() just frees
+    the entries of a table as soon as a write handler touches it. Bounded by
+    total bytes, least recently used first.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag, encoding):
+        with self._lock:
+            entry = self._data.get((etag, encoding))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end((etag, encoding))
+            self.hits += 1
+            return entry[0]
+
+    def set(self, etag, encoding, body, tables):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop((etag, encoding), None)
+            if old is not None:
+                self.size -= len(old[0])
+            self._data[(etag, encoding)] = (body, frozenset(tables))
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _) = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self, *models):
+        tables = {model.__tablename__ for model in models}
+        with self._lock:
+            for key, (body, entry_tables) in list(self._data.items()):
+                if entry_tables & tables:
+                    del self._data[key]
+                    self.size -= len(body)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        return {"entries": len(self._data), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+compressed_cache = CompressedCache()
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def compress(body, encoding, config):
+    if encoding == "br":
+        return brotli.compress(body, quality=config["COMPRESS_BROTLI_QUALITY"])
+    return gzip.compress(body, compresslevel=config["COMPRESS_LEVEL"], mtime=0)
+
+
+def setup_compression(app):
+    """gzip/brotli response compression, negotiated from Accept-Encoding.
+
+    COMPRESS_MIN_SIZE (bytes, default 500), COMPRESS_LEVEL (gzip 1-9, default
+    6), COMPRESS_BROTLI_QUALITY (0-11, default 5) and COMPRESS_CACHE_MB
+    (default 32, 0 disables the cache) come from the environment. Streamed
+    responses are left alone. A compressed body gets the weak form of the
+    identity body's ETag, so the two never share a strong validator while
+    If-None-Match (a weak comparison) still matches either.
+    """
+    app.config.setdefault("COMPRESS_MIN_SIZE", int(os.getenv("COMPRESS_MIN_SIZE", 500)))
+    app.config.setdefault("COMPRESS_LEVEL", int(os.getenv("COMPRESS_LEVEL", 6)))
+    app.config.setdefault("COMPRESS_BROTLI_QUALITY", int(os.getenv("COMPRESS_BROTLI_QUALITY", 5)))
+    compressed_cache.max_bytes = int(float(os.getenv("COMPRESS_CACHE_MB", 32)) * 1024 * 1024)
+    app.extensions["compressed_cache"] = compressed_cache
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            # Answer a client holding the compressed variant with its tag
+            etag, weak = response.get_etag()
+            if etag and not weak and request.if_none_match.is_weak(etag):
+                response.set_etag(etag, weak=True)
+            return response
+        if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+            return response
+        if "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if encoding is None or response.content_length is None:
+            return response
+        if response.content_length < app.config["COMPRESS_MIN_SIZE"]:
+            return response
+
+        # Only collection views (see conditional.py) are cached: their ETag
+        # is known before the body and names the tables it depends on
+        etag, weak = response.get_etag()
+        tables = g.get("collection_tables")
+        body = compressed_cache.get(etag, encoding) if tables and etag else None
+        if body is None:
+            body = compress(response.get_data(), encoding, app.config)
+            if tables and etag and compressed_cache.max_bytes:
+                compressed_cache.set(etag, encoding, body, tables)
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
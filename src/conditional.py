@@ -0,0 +1,59 @@
+import hashlib
+from functools import wraps
+from flask import request, make_response, Response, g
+from sqlalchemy import func
+from models import db
+
+
+def collection_etag(models, where=None):
+    # count(*) + max(id) per table changes on every insert and delete;
+    # max(updated_at) catches in-place updates and a deleted top id that
+    # SQLite hands out again. All three come from indexes, so it's cheap
+    # to poll
+    parts = []
+    for model in models:
+        query = db.session.query(func.count(model.id), func.max(model.id), func.max(model.updated_at))
+        if where and model in where:
+            query = query.filter(where[model])
+        count, max_id, updated_at = query.one()
+        parts.append("%s:%s:%s:%s" % (model.__tablename__, count, max_id, updated_at))
+    parts.append(request.full_path)
+    parts.append(request.headers.get("Accept", ""))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+def conditional_collection(*models, filters=None):
+    """Answer If-None-Match on a collection view before any row is serialized.
+
+    filters(**kwargs) may return {model: criterion} to scope the ETag to the
+    rows a URL argument selects. Without it, requests for a single row (any
+    URL argument set) go straight to the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if filters is None and any(value is not None for value in kwargs.values()):
+                return view(*args, **kwargs)
+            etag = collection_etag(models, filters(**kwargs) if filters is not None else None)
+            g.collection_tables = [model.__tablename__ for model in models]
+            # Weak comparison, compressed responses carry W/"<etag>"
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
+
+
+def add_body_etag(response):
+    # Fallback for every other GET: hash the body so clients still get a 304
+    if request.method != "GET" or response.status_code != 200:
+        return response
+    if response.is_streamed or "ETag" in response.headers:
+        return response
+    response.add_etag()
+    return response.make_conditional(request)
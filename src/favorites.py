@@ -0,0 +1,132 @@
+import click
+from collections import Counter
+from flask.cli import AppGroup
+from sqlalchemy import update, delete, select, func, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, utcnow, Favorite, Planet, Character
+from changes import record_changes
+from cache import cache
+
+# Tables with a favorite_count and the favorite column pointing at them
+COUNTED = ((Planet, "planet_id"), (Character, "character_id"))
+RECOUNT_BATCH_SIZE = 1000
+
+favorites_cli = AppGroup("favorites", help="Maintain the favorite_count counters.")
+
+
+def favorite_insert():
+    """INSERT into favorite that skips rows violating the unique indexes.
+
+    Uses ON CONFLICT DO NOTHING. Callers add RETURNING, as do the bulk
+    insert and delete paths, so only Postgres and SQLite 3.35+ (with
+    SQLAlchemy 2.0, hence the floor in the Pipfile) are supported.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(Favorite).on_conflict_do_nothing()
+    if dialect == "sqlite":
+        return sqlite.insert(Favorite).on_conflict_do_nothing()
+    raise NotImplementedError("Favorites need Postgres or SQLite, not %s" % dialect)
+
+
+def insert_favorite(user_id, planet_id=None, character_id=None):
+    # Returns the new Favorite, or None when the user already has it
+    stmt = favorite_insert().values(
+        user_id=user_id, planet_id=planet_id, character_id=character_id).returning(Favorite)
+    favorite = db.session.scalars(stmt).first()
+    touched = []
+    if favorite is not None:
+        record_changes(Favorite, [favorite.id])
+        touched = adjust_favorite_counts([favorite], 1)
+    db.session.commit()
+    invalidate_counts(touched)
+    return favorite
+
+
+def delete_favorite(user_id, planet_id=None, character_id=None):
+    # Returns False when the user doesn't have that favorite
+    stmt = delete(Favorite).where(Favorite.user_id == user_id)
+    if planet_id is not None:
+        stmt = stmt.where(Favorite.planet_id == planet_id)
+    else:
+        stmt = stmt.where(Favorite.character_id == character_id)
+    deleted = db.session.execute(stmt.returning(
+        Favorite.id, Favorite.planet_id, Favorite.character_id)).all()
+    record_changes(Favorite, [row.id for row in deleted], deleted=True)
+    touched = adjust_favorite_counts(deleted, -1)
+    db.session.commit()
+    invalidate_counts(touched)
+    return bool(deleted)
+
+
+def insert_favorites(rows, batch_size):
+    """Insert favorite rows in batches and return their ids in the same order.
+
+    Rows skipped because they already exist come back as None.
+    """
+    stmt = favorite_insert().returning(
+        Favorite.id, Favorite.user_id, Favorite.planet_id, Favorite.character_id)
+    ids = {}
+    touched = []
+    for start in range(0, len(rows), batch_size):
+        inserted = db.session.execute(stmt, rows[start:start + batch_size]).all()
+        for row in inserted:
+            ids[(row.user_id, row.planet_id, row.character_id)] = row.id
+        record_changes(Favorite, [row.id for row in inserted])
+        touched += adjust_favorite_counts(inserted, 1)
+    db.session.commit()
+    invalidate_counts(touched)
+    return [ids.get((row["user_id"], row["planet_id"], row["character_id"])) for row in rows]
+
+
+def adjust_favorite_counts(favorites, delta):
+    """Add delta to favorite_count of the planets/characters of favorites.
+
+    One UPDATE ... SET favorite_count = favorite_count + n per table, in the
+    caller's transaction, so concurrent writers can't lose an increment.
+    Returns the (model, id) pairs touched, for invalidate_counts() once the
+    transaction has committed.
+    """
+    touched = []
+    for model, column in COUNTED:
+        counts = Counter(getattr(favorite, column) for favorite in favorites
+                         if getattr(favorite, column) is not None)
+        if not counts:
+            continue
+        table = model.__table__
+        stmt = update(table).where(table.c.id == bindparam("row_id")).values(
+            favorite_count=table.c.favorite_count + bindparam("delta"), updated_at=utcnow())
+        # Sorted so concurrent transactions lock the rows in the same order
+        ids = sorted(counts)
+        db.session.execute(stmt, [{"row_id": id, "delta": counts[id] * delta} for id in ids])
+        record_changes(model, ids)
+        touched += [(model, id) for id in ids]
+    return touched
+
+
+def invalidate_counts(touched):
+    for model, id in touched:
+        cache.invalidate(model, id)
+
+
+@favorites_cli.command("recount")
+@click.option("--dry-run", is_flag=True, help="Only report the counters that are wrong.")
+def recount(dry_run):
+    """Backfill or repair favorite_count from the favorite table."""
+    for model, column in COUNTED:
+        table = model.__table__
+        actual = select(func.count(Favorite.id)).where(getattr(Favorite, column) == table.c.id) \
+            .correlate(table).scalar_subquery()
+        wrong = db.session.execute(select(table.c.id, table.c.favorite_count, actual.label("actual"))
+                                   .where(table.c.favorite_count != actual)).all()
+        click.echo("%-10s %d wrong counters" % (table.name, len(wrong)), err=True)
+        if wrong and not dry_run:
+            # Recomputed in SQL rather than from the values read above, in
+            # case favorites changed in between
+            for start in range(0, len(wrong), RECOUNT_BATCH_SIZE):
+                ids = [row.id for row in wrong[start:start + RECOUNT_BATCH_SIZE]]
+                db.session.execute(update(table).where(table.c.id.in_(ids)).values(
+                    favorite_count=actual, updated_at=utcnow()))
+                record_changes(model, ids)
+                db.session.commit()
+                invalidate_counts([(model, id) for id in ids])
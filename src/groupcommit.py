@@ -0,0 +1,184 @@
+import os
+import threading
+from sqlalchemy import delete, or_, and_
+from models import db, Favorite
+from changes import record_changes
+from favorites import favorite_insert, insert_favorite, delete_favorite, \
+    adjust_favorite_counts, invalidate_counts
+
+FAVORITE_COLUMNS = (Favorite.id, Favorite.user_id, Favorite.planet_id, Favorite.character_id)
+
+
+class Write:
+    """One caller's favorite insert or delete, waiting for its group."""
+
+    def __init__(self, kind, user_id, planet_id, character_id):
+        self.kind = kind
+        self.user_id = user_id
+        self.planet_id = planet_id
+        self.character_id = character_id
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def target(self):
+        # What a delete matches on, like delete_favorite()
+        if self.planet_id is not None:
+            return ("planet", self.user_id, self.planet_id)
+        return ("character", self.user_id, self.character_id)
+
+
+class Group:
+    def __init__(self):
+        self.writes = []
+        self.full = threading.Event()
+
+
+class GroupCommitter:
+    """Coalesces the favorite writes of concurrent requests into one commit.
+
+    The first write to arrive waits FAVORITE_GROUP_COMMIT_MS for others,
+    then runs the whole group (at most FAVORITE_GROUP_COMMIT_MAX writes) in
+    one transaction: one multi-row INSERT or DELETE per run of consecutive
+    inserts or deletes, one counter UPDATE, one commit. Every caller gets
+    the result it would have had on its own. If the transaction fails, the
+    writes are retried one at a time so only the bad ones get the error.
+    """
+
+    def __init__(self):
+        self.window = 0.0
+        self.max_size = 64
+        self.groups = 0
+        self.writes = 0
+        self.retried = 0
+        self._group = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Off unless FAVORITE_GROUP_COMMIT_MS is set above 0."""
+        self.window = float(os.getenv("FAVORITE_GROUP_COMMIT_MS", 0)) / 1000
+        self.max_size = int(os.getenv("FAVORITE_GROUP_COMMIT_MAX", 64))
+        app.extensions["group_commit"] = self
+
+    @property
+    def enabled(self):
+        # POST /batch already commits its sub-requests together
+        return self.window > 0 and not db.session.info.get("batch")
+
+    def insert(self, user_id, planet_id=None, character_id=None):
+        """Like insert_favorite(): the new Favorite, or None when the user already has it."""
+        if not self.enabled:
+            return insert_favorite(user_id, planet_id=planet_id, character_id=character_id)
+        return self.submit(Write("insert", user_id, planet_id, character_id))
+
+    def delete(self, user_id, planet_id=None, character_id=None):
+        """Like delete_favorite(): False when the user doesn't have that favorite."""
+        if not self.enabled:
+            return delete_favorite(user_id, planet_id=planet_id, character_id=character_id)
+        return self.submit(Write("delete", user_id, planet_id, character_id))
+
+    def submit(self, write):
+        with self._lock:
+            group = self._group
+            leader = group is None
+            if leader:
+                group = self._group = Group()
+            group.writes.append(write)
+            if len(group.writes) >= self.max_size:
+                self._group = None
+                group.full.set()
+        if leader:
+            group.full.wait(self.window)
+            with self._lock:
+                if self._group is group:
+                    self._group = None
+            self.run(group.writes)
+        else:
+            write.done.wait()
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def run(self, writes):
+        """Execute a closed group in the leader's session and wake its callers."""
+        try:
+            try:
+                touched = self.execute(writes)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self.retried += 1
+                touched = []
+                for write in writes:
+                    try:
+                        touched += self.execute([write])
+                        db.session.commit()
+                    except Exception as error:
+                        db.session.rollback()
+                        write.result, write.error = None, error
+            invalidate_counts(touched)
+            self.groups += 1
+            self.writes += len(writes)
+        except Exception as error:
+            for write in writes:
+                if not write.done.is_set():
+                    write.result, write.error = None, error
+            raise
+        finally:
+            for write in writes:
+                write.done.set()
+
+    def execute(self, writes):
+        """Run writes in the current transaction, returns the counters touched."""
+        touched = []
+        start = 0
+        while start < len(writes):
+            end = start
+            while end < len(writes) and writes[end].kind == writes[start].kind:
+                end += 1
+            if writes[start].kind == "insert":
+                touched += self.insert_run(writes[start:end])
+            else:
+                touched += self.delete_run(writes[start:end])
+            start = end
+        return touched
+
+    def insert_run(self, writes):
+        rows = {}
+        for write in writes:
+            rows.setdefault((write.user_id, write.planet_id, write.character_id), write)
+        inserted = db.session.execute(favorite_insert().returning(*FAVORITE_COLUMNS), [
+            {"user_id": user_id, "planet_id": planet_id, "character_id": character_id}
+            for user_id, planet_id, character_id in rows]).all()
+        by_key = {(row.user_id, row.planet_id, row.character_id): row for row in inserted}
+        for write in writes:
+            row = by_key.get((write.user_id, write.planet_id, write.character_id))
+            # Only the first caller asking for a favorite creates it
+            first = row is not None and rows[(row.user_id, row.planet_id, row.character_id)] is write
+            write.result = Favorite(**row._asdict()) if first else None
+        record_changes(Favorite, [row.id for row in inserted])
+        return adjust_favorite_counts(inserted, 1)
+
+    def delete_run(self, writes):
+        targets = {}
+        for write in writes:
+            targets.setdefault(write.target, write)
+        stmt = delete(Favorite).where(or_(*[
+            and_(Favorite.user_id == user_id,
+                 (Favorite.planet_id if kind == "planet" else Favorite.character_id) == target_id)
+            for kind, user_id, target_id in targets])).returning(*FAVORITE_COLUMNS)
+        deleted = db.session.execute(stmt).all()
+        gone = {("planet", row.user_id, row.planet_id) for row in deleted}
+        gone |= {("character", row.user_id, row.character_id) for row in deleted}
+        for write in writes:
+            write.result = write.target in gone and targets[write.target] is write
+        record_changes(Favorite, [row.id for row in deleted], deleted=True)
+        return adjust_favorite_counts(deleted, -1)
+
+    def stats(self):
+        return {"enabled": self.window > 0, "window_ms": self.window * 1000, "max_size": self.max_size,
+                "groups": self.groups, "writes": self.writes, "retried_groups": self.retried}
+
+
+favorite_writes = GroupCommitter()
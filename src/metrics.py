@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+from models import db
+
+logger = logging.getLogger("api.performance")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class ThreadStore:
+    """Counters written by a single thread only, so updates need no lock."""
+
+    def __init__(self):
+        self.requests = defaultdict(int)
+        self.duration_buckets = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+        self.duration_sum = defaultdict(float)
+        self.sql_queries = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        self.response_bytes = defaultdict(int)
+
+
+def add_counts(totals, store):
+    """Add the counters of store into totals."""
+    for key, value in list(store.requests.items()):
+        totals.requests[key] += value
+    for key, counts in list(store.duration_buckets.items()):
+        merged = totals.duration_buckets[key]
+        for index, value in enumerate(counts):
+            merged[index] += value
+    for name in ("duration_sum", "sql_queries", "sql_seconds", "response_bytes"):
+        target = getattr(totals, name)
+        for key, value in list(getattr(store, name).items()):
+            target[key] += value
+
+
+class Metrics:
+    def __init__(self):
+        self._local = threading.local()
+        # Store of every live thread, and the counts of the ones that exited
+        self._stores = {}
+        self._retired = ThreadStore()
+        self._lock = threading.Lock()
+
+    def store(self):
+        store = getattr(self._local, "store", None)
+        if store is None:
+            store = self._local.store = ThreadStore()
+            # Taken once per thread, never on the request path afterwards
+            with self._lock:
+                self.retire_dead_threads()
+                self._stores[threading.current_thread()] = store
+        return store
+
+    def retire_dead_threads(self):
+        # A server starting a thread per request would otherwise keep one
+        # store per request; an exited thread's store is no longer written
+        for thread in [thread for thread in self._stores if not thread.is_alive()]:
+            add_counts(self._retired, self._stores.pop(thread))
+
+    def observe_request(self, endpoint, method, status, seconds, queries, sql_seconds, size):
+        store = self.store()
+        store.requests[(endpoint, method, status)] += 1
+        store.duration_buckets[endpoint][bisect_left(BUCKETS, seconds)] += 1
+        store.duration_sum[endpoint] += seconds
+        store.sql_queries[endpoint] += queries
+        store.sql_seconds[endpoint] += sql_seconds
+        store.response_bytes[endpoint] += size
+
+    def merged(self):
+        totals = ThreadStore()
+        with self._lock:
+            self.retire_dead_threads()
+            add_counts(totals, self._retired)
+            stores = list(self._stores.values())
+        for store in stores:
+            add_counts(totals, store)
+        return totals
+
+    def render(self, extra=None):
+        """Prometheus text exposition format for this worker."""
+        totals = self.merged()
+        lines = [
+            "# TYPE http_requests_total counter",
+        ]
+        for (endpoint, method, status), value in sorted(totals.requests.items()):
+            lines.append('http_requests_total{endpoint="%s",method="%s",status="%s"} %d'
+                         % (endpoint, method, status, value))
+        lines.append("# TYPE http_request_duration_seconds histogram")
+        for endpoint, counts in sorted(totals.duration_buckets.items()):
+            cumulative = 0
+            for bound, value in zip(BUCKETS + ("+Inf",), counts):
+                cumulative += value
+                lines.append('http_request_duration_seconds_bucket{endpoint="%s",le="%s"} %d'
+                             % (endpoint, bound, cumulative))
+            lines.append('http_request_duration_seconds_sum{endpoint="%s"} %f'
+                         % (endpoint, totals.duration_sum[endpoint]))
+            lines.append('http_request_duration_seconds_count{endpoint="%s"} %d' % (endpoint, cumulative))
+        for name, kind, values, fmt in (
+            ("http_request_sql_queries_total", "counter", totals.sql_queries, "%d"),
+            ("http_request_sql_seconds_total", "counter", totals.sql_seconds, "%f"),
+            ("http_response_size_bytes_total", "counter", totals.response_bytes, "%d"),
+        ):
+            lines.append("# TYPE %s %s" % (name, kind))
+            for endpoint, value in sorted(values.items()):
+                lines.append(('%s{endpoint="%s"} ' + fmt) % (name, endpoint, value))
+        for name, value in sorted((extra or {}).items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append("# TYPE %s gauge" % name)
+                lines.append("%s %s" % (name, value))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def setup_metrics(app, extra_metrics=None):
+    """Record latency, SQL count/time and response size for every request.
+
+    Thresholds come from METRICS_SLOW_REQUEST_MS, METRICS_SLOW_QUERY_MS and
+    METRICS_SAMPLE_RATE (fraction of requests instrumented). SQL run while a
+    streamed body is being sent is not attributed to the request.
+    extra_metrics() may return a dict of gauges to append to /metrics.
+    """
+    slow_request = float(os.getenv("METRICS_SLOW_REQUEST_MS", 500)) / 1000
+    slow_query = float(os.getenv("METRICS_SLOW_QUERY_MS", 100)) / 1000
+    sample_rate = float(os.getenv("METRICS_SAMPLE_RATE", 1.0))
+
+    with app.app_context():
+        engines = [db.engine]
+    if "replicas" in app.extensions:
+        engines += [replica.engine for replica in app.extensions["replicas"].replicas]
+
+    # The start time lives on the statement's execution context, not on the
+    # connection: after_cursor_execute is skipped when a statement raises
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.metrics_start = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "metrics_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if has_request_context() and g.get("metrics_start") is not None:
+            g.sql_queries += 1
+            g.sql_seconds += elapsed
+        if elapsed >= slow_query:
+            logger.warning(json.dumps({
+                "event": "slow_query",
+                "duration_ms": round(elapsed * 1000, 3),
+                "statement": statement[:500],
+            }))
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    @app.before_request
+    def start_timer():
+        if sample_rate >= 1 or random.random() < sample_rate:
+            g.metrics_start = time.perf_counter()
+            g.sql_queries = 0
+            g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        start = g.get("metrics_start")
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        size = response.content_length or 0
+        metrics.observe_request(endpoint, request.method, response.status_code,
+                                elapsed, g.sql_queries, g.sql_seconds, size)
+        if elapsed >= slow_request:
+            logger.warning(json.dumps({
+                "event": "slow_request",
+                "endpoint": endpoint,
+                "method": request.method,
+                "path": request.full_path,
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 3),
+                "sql_queries": g.sql_queries,
+                "sql_ms": round(g.sql_seconds * 1000, 3),
+                "response_bytes": size,
+            }))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        extra = extra_metrics() if extra_metrics is not None else None
+        return Response(metrics.render(extra), mimetype="text/plain; version=0.0.4")
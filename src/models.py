@@ -1,7 +1,16 @@
+import sqlite3
+from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import ForeignKey, Column, Integer, String
+from sqlalchemy import ForeignKey, Column, Integer, String, DDL, event
+from replicas import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def utcnow():
+    # Naive UTC, the same on every backend
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
-db = SQLAlchemy()
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -9,7 +18,11 @@ class User(db.Model):
     password = db.Column(db.String(80), nullable=False)
     first_name = db.Column(db.String(120), nullable=True)
     last_name = db.Column(db.String(120), nullable=True)
-    favorites = db.relationship("Favorite", back_populates="user")
+    favorites = db.relationship("Favorite", back_populates="user", passive_deletes=True)
+    created_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow, onupdate=utcnow, index=True)
+    # Campos que devuelve serialize(), los que se pueden pedir con ?fields=
+    serialize_fields = ("id", "email", "first_name", "last_name", "favorites")
 
     def __repr__(self):
         return '<User %r>' % self.username
@@ -26,13 +39,27 @@ class User(db.Model):
 
 class Favorite(db.Model):
     __tablename__ = 'favorite'
+    __table_args__ = (
+        db.Index('ix_favorite_user_id', 'user_id', 'planet_id', 'character_id'),
+        db.Index('ix_favorite_planet_id', 'planet_id'),
+        db.Index('ix_favorite_character_id', 'character_id'),
+        db.Index('uq_favorite_user_planet', 'user_id', 'planet_id', unique=True,
+                 postgresql_where=db.text('planet_id IS NOT NULL'),
+                 sqlite_where=db.text('planet_id IS NOT NULL')),
+        db.Index('uq_favorite_user_character', 'user_id', 'character_id', unique=True,
+                 postgresql_where=db.text('character_id IS NOT NULL'),
+                 sqlite_where=db.text('character_id IS NOT NULL')),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'))
     user = db.relationship("User", back_populates="favorites")
-    planet_id = db.Column(db.Integer, db.ForeignKey('planet.id'))
+    planet_id = db.Column(db.Integer, db.ForeignKey('planet.id', ondelete='CASCADE'))
     planet = db.relationship("Planet", back_populates="favorites")
-    character_id = db.Column(db.Integer, db.ForeignKey('character.id'))
+    character_id = db.Column(db.Integer, db.ForeignKey('character.id', ondelete='CASCADE'))
     character = db.relationship("Character", back_populates="favorites")
+    created_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow, onupdate=utcnow, index=True)
+    serialize_fields = ("id", "user_id", "planet_id", "character_id")
 
     def __repr__(self):
         return '<Favorite %r>' % self.id
@@ -45,12 +72,27 @@ class Favorite(db.Model):
             "character_id": self.character_id
         }
 
+    def serialize_expanded(self):
+        data = self.serialize()
+        data["planet"] = self.planet.serialize() if self.planet is not None else None
+        data["character"] = self.character.serialize() if self.character is not None else None
+        return data
+
 class Planet(db.Model):
     __tablename__ = 'planet'
+    __table_args__ = (
+        # GET /planets?sort=popular lee el top N recorriendo este indice
+        db.Index('ix_planet_favorite_count', 'favorite_count', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(250), nullable=False)
+    name = db.Column(db.String(250), nullable=False, index=True)
     description = db.Column(db.String(1000), nullable=True)
-    favorites = db.relationship("Favorite", back_populates="planet")
+    favorites = db.relationship("Favorite", back_populates="planet", passive_deletes=True)
+    # Numero de favoritos, lo mantienen favorites.py y `flask favorites recount`
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow, onupdate=utcnow, index=True)
+    serialize_fields = ("id", "name", "description", "favorite_count")
 
     def __repr__(self):
         return '<Planet %r>' % self.name
@@ -59,15 +101,23 @@ class Planet(db.Model):
         return {
             "id": self.id,
             "name": self.name,
-            "description": self.description
+            "description": self.description,
+            "favorite_count": self.favorite_count
         }
 
 class Character(db.Model):
     __tablename__ = 'character'
+    __table_args__ = (
+        db.Index('ix_character_favorite_count', 'favorite_count', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(250), nullable=False)
+    name = db.Column(db.String(250), nullable=False, index=True)
     description = db.Column(db.String(1000), nullable=True)
-    favorites = db.relationship("Favorite", back_populates="character")
+    favorites = db.relationship("Favorite", back_populates="character", passive_deletes=True)
+    favorite_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, nullable=True, default=utcnow)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow, onupdate=utcnow, index=True)
+    serialize_fields = ("id", "name", "description", "favorite_count")
 
     def __repr__(self):
         return '<Character %r>' % self.name
@@ -76,5 +126,60 @@ class Character(db.Model):
         return {
             "id": self.id,
             "name": self.name,
-            "description": self.description
+            "description": self.description,
+            "favorite_count": self.favorite_count
         }
+
+
+class Change(db.Model):
+    # Ultimo cambio de cada fila de planet/character/favorite, id es el token de GET /changes.
+    # AUTOINCREMENT para que SQLite no reutilice un id ya entregado a un cliente
+    __tablename__ = 'change'
+    # txid es la transaccion de Postgres que escribio la fila (0 en SQLite); el token es (txid, id)
+    __table_args__ = (
+        db.Index('ix_change_table_row', 'table_name', 'row_id'),
+        db.Index('ix_change_position', 'txid', 'id'),
+        {'sqlite_autoincrement': True},
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    txid = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    def __repr__(self):
+        return '<Change %r>' % self.id
+
+
+# Word index for ?prefix=, trigram index for ?search= (any substring, like
+# the Postgres trigram index). The trigram tokenizer only takes
+# remove_diacritics from SQLite 3.45 on
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+TRIGRAM_TOKENIZE = "trigram case_sensitive 0" + (" remove_diacritics 1" if sqlite3.sqlite_version_info >= (3, 45) else "")
+
+
+def sqlite_fts_ddl(table, fts=None, tokenize=FTS_TOKENIZE):
+    # FTS5 index over name for SQLite, kept in sync with triggers
+    fts = fts or table + "_fts"
+    return [
+        "CREATE VIRTUAL TABLE %s USING fts5(name, content='%s', content_rowid='id', "
+        "tokenize='%s')" % (fts, table, tokenize),
+        "CREATE TRIGGER %s_ai AFTER INSERT ON %s BEGIN "
+        "INSERT INTO %s(rowid, name) VALUES (new.id, new.name); END" % (fts, table, fts),
+        "CREATE TRIGGER %s_ad AFTER DELETE ON %s BEGIN "
+        "INSERT INTO %s(%s, rowid, name) VALUES ('delete', old.id, old.name); END" % (fts, table, fts, fts),
+        "CREATE TRIGGER %s_au AFTER UPDATE ON %s BEGIN "
+        "INSERT INTO %s(%s, rowid, name) VALUES ('delete', old.id, old.name); "
+        "INSERT INTO %s(rowid, name) VALUES (new.id, new.name); END" % (fts, table, fts, fts, fts),
+        "INSERT INTO %s(%s) VALUES ('rebuild')" % (fts, fts),
+    ]
+
+
+for model in (Planet, Character):
+    name = model.__tablename__
+    for statement in sqlite_fts_ddl(name) + sqlite_fts_ddl(name, name + "_fts_trigram", TRIGRAM_TOKENIZE):
+        event.listen(model.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    for fts in (name + "_fts", name + "_fts_trigram"):
+        event.listen(model.__table__, "before_drop",
+                     DDL("DROP TABLE IF EXISTS %s" % fts).execute_if(dialect="sqlite"))
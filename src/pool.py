@@ -0,0 +1,138 @@
+import os
+import time
+import weakref
+import threading
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, NullPool
+from models import db
+
+
+def env_flag(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self.lock:
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+
+pool_stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record_wait(time.perf_counter() - start)
+        return connection
+
+
+def engine_options(db_url):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from DB_* environment variables.
+
+    Size DB_POOL_SIZE + DB_MAX_OVERFLOW per gunicorn worker so that
+    workers * (size + overflow) stays under the server's max_connections.
+    Set DB_NULLPOOL=1 when an external pgbouncer does the pooling.
+    """
+    options = {"pool_pre_ping": env_flag("DB_POOL_PRE_PING", True)}
+    if env_flag("DB_NULLPOOL"):
+        options["poolclass"] = NullPool
+    elif not db_url.startswith("sqlite"):
+        options.update({
+            "poolclass": TimedQueuePool,
+            "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 5)),
+            "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        })
+    statement_timeout = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+    if statement_timeout is not None and db_url.startswith("postgresql"):
+        options["connect_args"] = {"options": "-c statement_timeout=%d" % int(statement_timeout)}
+    return options
+
+
+# Engines to reset in a forked child. Weak, so engines of apps that are
+# gone (one per create_app() in the tests) aren't kept alive
+_fork_engines = weakref.WeakSet()
+
+
+def _dispose_after_fork():
+    # Never reuse connections inherited from the parent process (gunicorn
+    # --preload): drop them in the child without closing the parent's sockets
+    for engine in list(_fork_engines):
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+def dispose_after_fork(engine):
+    _fork_engines.add(engine)
+
+
+def setup_pool(app):
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        pool_stats.connects += 1
+        if engine.dialect.name == "sqlite":
+            # SQLite ignores foreign keys (and ON DELETE CASCADE) unless asked
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA foreign_keys=ON")
+            cursor.close()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        pool_stats.checkouts += 1
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        pool_stats.invalidations += 1
+
+    dispose_after_fork(engine)
+
+
+def pool_status():
+    pool = db.engine.pool
+    status = {
+        "pool": type(pool).__name__,
+        "connects": pool_stats.connects,
+        "checkouts": pool_stats.checkouts,
+        "invalidations": pool_stats.invalidations,
+        "timeouts": pool_stats.timeouts,
+        "wait_seconds_total": round(pool_stats.wait_seconds, 6),
+        "wait_seconds_max": round(pool_stats.max_wait_seconds, 6)
+    }
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow()
+        })
+    return status
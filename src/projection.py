@@ -0,0 +1,48 @@
+from flask import request
+from sqlalchemy.orm import load_only, selectinload
+from utils import APIException
+
+
+def requested_fields(model):
+    """Fields asked for with ?fields=a,b, always including id; None if absent."""
+    value = request.args.get("fields")
+    if value is None:
+        return None
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in model.serialize_fields]
+    if unknown:
+        raise APIException("Unknown fields: %s" % ", ".join(unknown), status_code=400)
+    if "id" not in fields:
+        # Keyset pagination needs the id of the last row
+        fields.insert(0, "id")
+    return fields
+
+
+def project(query, model, fields):
+    """Restrict the SELECT to fields and return (query, serialize).
+
+    Plain columns are selected as row tuples with no ORM objects built.
+    Relationships (User.favorites) keep ORM loading, but only with the
+    requested columns plus one selectin query per relationship.
+    """
+    columns = [field for field in fields if field in model.__table__.columns]
+    if len(columns) == len(fields):
+        query = query.with_entities(*[getattr(model, column) for column in columns])
+        return query, lambda row: row._asdict()
+
+    relationships = [field for field in fields if field not in columns]
+    query = query.options(load_only(*[getattr(model, column) for column in columns]),
+                          *[selectinload(getattr(model, name)) for name in relationships])
+
+    def serialize(row):
+        data = {column: getattr(row, column) for column in columns}
+        for name in relationships:
+            data[name] = [related.serialize() for related in getattr(row, name)]
+        return data
+    return query, serialize
+
+
+def trim(data, fields):
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key in fields}
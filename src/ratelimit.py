@@ -0,0 +1,210 @@
+import os
+import math
+import time
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import request, jsonify, current_app
+
+
+class MemoryBucketStore:
+    """Token buckets kept in this worker, least recently used keys dropped first."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, rate, burst):
+        """Take cost tokens from key's bucket. Returns (allowed, retry_after)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (cost - tokens) / rate
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# Refill and take in one round trip, timed by the Redis clock so every
+# worker agrees on it
+TAKE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketStore:
+    """Token buckets in Redis hashes, so a client has one bucket across workers.
+
+    The refill and take run in a Lua script, atomically on the Redis side.
+    """
+
+    def __init__(self, url, prefix="swapi:ratelimit:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, cost, rate, burst):
+        allowed, retry_after = self.script(keys=[self.prefix + key], args=[rate, burst, cost])
+        return bool(allowed), float(retry_after)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def too_many(msg, status, retry_after):
+    response = jsonify({"msg": msg})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class RateLimiter:
+    """Admission control in front of the views.
+
+    Every request takes its route's cost from a token bucket per client
+    (an allow-listed X-API-Key header, else the remote address) and gets a
+    429 when the bucket is empty. Routes marked expensive also run at most
+    RATE_LIMIT_MAX_CONCURRENT at a time per worker; extra requests wait up
+    to RATE_LIMIT_QUEUE_TIMEOUT_MS and then get a 503.
+    """
+
+    def __init__(self, store=None):
+        self.store = store if store is not None else MemoryBucketStore()
+        # A store given here is kept by init_app
+        self._store_injected = store is not None
+        self.enabled = False
+        self.rate = 20.0
+        self.burst = 40.0
+        self.max_concurrent = 4
+        self.queue_timeout = 0.1
+        self.api_keys = frozenset()
+        self.rejected = 0
+        self.shed = 0
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Settings from RATE_LIMIT_ENABLED, RATE_LIMIT_RATE (tokens/s),
+        RATE_LIMIT_BURST, RATE_LIMIT_MAX_CONCURRENT, RATE_LIMIT_QUEUE_TIMEOUT_MS,
+        RATE_LIMIT_API_KEYS (comma separated keys that get their own bucket)
+        and RATE_LIMIT_REDIS_URL (share the buckets between workers)."""
+        self.enabled = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+        self.rate = float(os.getenv("RATE_LIMIT_RATE", 20))
+        self.burst = float(os.getenv("RATE_LIMIT_BURST", 40))
+        self.max_concurrent = int(os.getenv("RATE_LIMIT_MAX_CONCURRENT", 4))
+        self.queue_timeout = float(os.getenv("RATE_LIMIT_QUEUE_TIMEOUT_MS", 100)) / 1000
+        self.api_keys = frozenset(key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",")
+                                  if key.strip())
+        redis_url = os.getenv("RATE_LIMIT_REDIS_URL")
+        if redis_url is not None and not self._store_injected:
+            self.store = RedisBucketStore(redis_url)
+        app.extensions["rate_limiter"] = self
+        if self.enabled:
+            app.before_request(self.admit)
+
+    def limit(self, cost=1, expensive=False):
+        """Set the token cost of a view and optionally cap its concurrency."""
+        def decorator(view):
+            if expensive:
+                @wraps(view)
+                def wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return view(*args, **kwargs)
+                    semaphore = self.semaphore(view.__name__)
+                    if not semaphore.acquire(timeout=self.queue_timeout):
+                        self.shed += 1
+                        return too_many("Server busy, retry later", 503, 1)
+                    try:
+                        response = current_app.make_response(view(*args, **kwargs))
+                    except BaseException:
+                        semaphore.release()
+                        raise
+                    # A streamed body is only generated after the view has
+                    # returned, so hold the slot until the response is closed
+                    response.call_on_close(semaphore.release)
+                    return response
+            else:
+                wrapper = view
+            wrapper.rate_limit_cost = cost
+            return wrapper
+        return decorator
+
+    def semaphore(self, name):
+        with self._lock:
+            if name not in self._semaphores:
+                self._semaphores[name] = threading.BoundedSemaphore(self.max_concurrent)
+            return self._semaphores[name]
+
+    def client_key(self):
+        return self.bucket_key(request.headers.get("X-API-Key"), request.remote_addr)
+
+    def bucket_key(self, api_key, address):
+        # Unknown keys are ignored, or a client could get a fresh bucket
+        # per request by making one up
+        if api_key in self.api_keys:
+            return "key:" + api_key
+        return "ip:%s" % address
+
+    def admit(self):
+        if request.method == "OPTIONS" or request.endpoint is None:
+            return None
+        cost = self.cost(request.endpoint)
+        if cost <= 0:
+            return None
+        return self.charge(cost)
+
+    def cost(self, endpoint):
+        return getattr(current_app.view_functions.get(endpoint), "rate_limit_cost", 1)
+
+    def charge(self, cost, whole=False):
+        """Take cost tokens from the current client, returns a 429 response or None.
+
+        A route costing more than the bucket holds takes the whole bucket.
+        With whole=True (the summed cost of a batch of calls) such a cost
+        is rejected instead, since the calls sent one by one would be too.
+        """
+        if whole and cost > self.burst:
+            self.rejected += 1
+            return too_many("Request costs %g tokens, the limit is %g" % (cost, self.burst), 429,
+                            self.burst / self.rate)
+        allowed, retry_after = self.store.take(self.client_key(), min(cost, self.burst), self.rate, self.burst)
+        if allowed:
+            return None
+        self.rejected += 1
+        return too_many("Too many requests", 429, retry_after)
+
+    def stats(self):
+        return {"enabled": self.enabled, "rate": self.rate, "burst": self.burst,
+                "max_concurrent": self.max_concurrent, "rejected": self.rejected, "shed": self.shed}
+
+
+limiter = RateLimiter()
@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+from flask import current_app, request, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text, event
+
+READ_METHODS = ("GET", "HEAD")
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+# Replay lag of a Postgres standby. The last replayed commit gets older
+# while the primary has no writes, so a standby that has replayed all the
+# WAL it received counts as caught up
+LAG_QUERY = """
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+
+class Replica:
+    def __init__(self, url, engine):
+        self.url = url
+        self.engine = engine
+        self.healthy = True
+        self.checked_at = 0.0
+        self.lag_seconds = None
+        self.error = None
+
+
+class ReplicaSet:
+    """Read replicas picked round-robin, skipping the ones failing health checks.
+
+    A replica is checked with SELECT 1 (plus replay lag on Postgres) at most
+    every DB_REPLICA_CHECK_INTERVAL seconds, from the request that picks it,
+    and is taken out right away when one of its connections drops.
+    """
+
+    def __init__(self, urls, engine_options):
+        self.check_interval = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 5))
+        self.max_lag = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", 30))
+        self.read_your_writes = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5))
+        self.replicas = []
+        for url in urls:
+            replica = Replica(url, create_engine(url, **engine_options(url)))
+            event.listen(replica.engine, "handle_error", self.on_error(replica))
+            self.replicas.append(replica)
+        self.reads = 0
+        self.fallbacks = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def on_error(self, replica):
+        def handle_error(context):
+            if context.is_disconnect:
+                replica.healthy = False
+                replica.checked_at = time.monotonic()
+                replica.error = str(context.original_exception)[:200]
+        return handle_error
+
+    def check(self, replica):
+        replica.checked_at = time.monotonic()
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+                if replica.engine.dialect.name == "postgresql":
+                    replica.lag_seconds = float(connection.execute(text(LAG_QUERY)).scalar())
+            replica.healthy = replica.lag_seconds is None or replica.lag_seconds <= self.max_lag
+            replica.error = None if replica.healthy else "lag %.1fs" % replica.lag_seconds
+        except Exception as error:
+            replica.healthy = False
+            replica.error = str(error)[:200]
+
+    def pick(self):
+        """Next healthy replica engine, or None to use the primary."""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        now = time.monotonic()
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if now - replica.checked_at >= self.check_interval:
+                self.check(replica)
+            if replica.healthy:
+                self.reads += 1
+                return replica.engine
+        self.fallbacks += 1
+        return None
+
+    def status(self):
+        return {
+            "reads": self.reads,
+            "primary_fallbacks": self.fallbacks,
+            "replicas": [{
+                "url": replica.engine.url.render_as_string(hide_password=True),
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag_seconds,
+                "error": replica.error,
+            } for replica in self.replicas],
+        }
+
+
+class RoutingSession(Session):
+    """Session that sends the SELECTs of GET/HEAD requests to a replica.
+
+    Everything else stays on the primary: writes, statements outside a
+    request (CLI, migrations), sessions holding pending changes, and reads
+    from clients that wrote within the read-your-writes window. One request
+    sticks to one replica so its queries see the same snapshot.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.reads_from_replica(clause):
+            if "replica" not in g:
+                g.replica = current_app.extensions["replicas"].pick()
+            if g.replica is not None:
+                return g.replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def commit(self):
+        # POST /batch runs every sub-request in one transaction and commits
+        # once at the end; the handlers' own commits only flush
+        if self.info.get("batch"):
+            self.flush()
+            return
+        super().commit()
+
+    def reads_from_replica(self, clause):
+        if not has_request_context() or "replicas" not in current_app.extensions:
+            return False
+        if request.method not in READ_METHODS or g.get("read_primary"):
+            return False
+        if self.new or self.dirty or self.deleted:
+            return False
+        return clause is not None and getattr(clause, "is_select", False)
+
+
+def setup_replicas(app, engine_options):
+    """Route reads to DATABASE_REPLICA_URLS (comma separated), if set."""
+    urls = [url.strip().replace("postgres://", "postgresql://")
+            for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    if not urls:
+        return None
+    replicas = ReplicaSet(urls, engine_options)
+    app.extensions["replicas"] = replicas
+
+    @app.before_request
+    def read_your_writes():
+        until = request.cookies.get(READ_PRIMARY_COOKIE)
+        if until is not None and until.isdigit() and int(until) > time.time():
+            g.read_primary = True
+
+    @app.after_request
+    def remember_write(response):
+        # Keep this client's reads on the primary until replicas catch up
+        if request.method not in READ_METHODS + ("OPTIONS",) and response.status_code < 400:
+            window = replicas.read_your_writes
+            response.set_cookie(READ_PRIMARY_COOKIE, str(int(time.time()) + window),
+                                max_age=window, httponly=True, samesite="Lax")
+        return response
+
+    # Not at the top: models imports this module and pool imports models
+    from pool import dispose_after_fork
+    for replica in replicas.replicas:
+        dispose_after_fork(replica.engine)
+    return replicas
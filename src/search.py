@@ -0,0 +1,80 @@
+from flask import request
+from sqlalchemy import func, select, text, literal_column, table
+from utils import APIException, MAX_PAGE_SIZE
+from models import db
+
+
+def parse_ids(value):
+    try:
+        ids = [int(id) for id in value.split(",") if id.strip()]
+    except ValueError:
+        raise APIException("Invalid ids", status_code=400)
+    if not ids or len(ids) > MAX_PAGE_SIZE:
+        raise APIException("ids must list between 1 and %d ids" % MAX_PAGE_SIZE, status_code=400)
+    return ids
+
+
+def escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def name_search(query, model, term, prefix=False):
+    """Case and accent insensitive search on name.
+
+    Postgres uses the f_unaccent(lower(name)) trigram index. SQLite uses
+    the <table>_fts FTS5 word index for prefixes and the
+    <table>_fts_trigram index for substrings; the trigram index needs at
+    least 3 characters, shorter terms fall back to LIKE.
+    """
+    term = term.strip()
+    if not term:
+        raise APIException("Empty search term", status_code=400)
+    dialect = db.engine.dialect.name
+    quoted = '"%s"' % term.replace('"', '""')
+    if dialect == "sqlite" and (prefix or len(term) >= 3):
+        if prefix:
+            fts, match = model.__tablename__ + "_fts", "^ %s *" % quoted
+        else:
+            fts, match = model.__tablename__ + "_fts_trigram", quoted
+        ids = select(literal_column("rowid")).select_from(table(fts)).where(
+            text("%s MATCH :match" % fts).bindparams(match=match))
+        return query.filter(model.id.in_(ids))
+    pattern = escape_like(term) + "%"
+    if not prefix:
+        pattern = "%" + pattern
+    if dialect == "postgresql":
+        return query.filter(func.f_unaccent(func.lower(model.name)).like(
+            func.f_unaccent(func.lower(pattern)), escape="\\"))
+    return query.filter(model.name.ilike(pattern, escape="\\"))
+
+
+def filter_catalog(query, model):
+    """Apply ?ids=, ?name= (exact), ?prefix= and ?search= to a planet/character query."""
+    args = request.args
+    if "ids" in args:
+        query = query.filter(model.id.in_(parse_ids(args["ids"])))
+    if "name" in args:
+        query = query.filter(model.name == args["name"])
+    if "prefix" in args:
+        query = name_search(query, model, args["prefix"], prefix=True)
+    if "search" in args:
+        query = name_search(query, model, args["search"])
+    return query
+
+
+def popular(query, model):
+    """Top ?limit= rows (default 10) by favorite_count, read in index order.
+
+    ORDER BY favorite_count DESC, id DESC walks ix_<table>_favorite_count
+    backwards and stops after limit rows.
+    """
+    limit = request.args.get("limit", 10)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise APIException("Invalid limit", status_code=400)
+    if limit < 1:
+        raise APIException("Invalid limit", status_code=400)
+    if "after" in request.args:
+        raise APIException("sort=popular can't be paginated with after", status_code=400)
+    return query.order_by(model.favorite_count.desc(), model.id.desc()).limit(min(limit, MAX_PAGE_SIZE)).all()
@@ -0,0 +1,144 @@
+import io
+import json
+import gzip
+import time
+import click
+from datetime import datetime
+from flask.cli import AppGroup
+from sqlalchemy import select, func, text, DateTime
+from models import db
+
+# FK order: parents before favorite, then the change log
+TABLES = ("user", "planet", "character", "favorite", "change")
+FORMAT = "swapi-snapshot"
+
+snapshot_cli = AppGroup("snapshot", help="Export and import user, planet, character, favorite and change.")
+
+
+class Progress:
+    def __init__(self, table):
+        self.table = table
+        self.rows = 0
+        self.start = time.perf_counter()
+
+    def add(self, rows):
+        self.rows += rows
+        self.report(end="\r")
+
+    def report(self, end="\n"):
+        elapsed = time.perf_counter() - self.start
+        rate = self.rows / elapsed if elapsed else 0
+        click.echo("%-10s %10d rows %10.0f rows/s" % (self.table, self.rows, rate), err=True, nl=False)
+        click.echo(end, err=True, nl=False)
+
+
+@snapshot_cli.command("export")
+@click.argument("path")
+@click.option("--chunk-size", default=10000, show_default=True, help="Rows per block.")
+def export_snapshot(path, chunk_size):
+    """Write every table to PATH as gzip NDJSON, one columnar block per line."""
+    connection = db.session.connection().execution_options(stream_results=True, yield_per=chunk_size)
+    with gzip.open(path, "wt", encoding="utf8", compresslevel=6) as f:
+        f.write(json.dumps({"format": FORMAT, "version": 1, "tables": list(TABLES)}) + "\n")
+        for name in TABLES:
+            table = db.metadata.tables[name]
+            columns = [column.name for column in table.columns]
+            progress = Progress(name)
+            result = connection.execute(select(table).order_by(table.c.id))
+            for rows in result.partitions(chunk_size):
+                block = {column: [row[index] for row in rows] for index, column in enumerate(columns)}
+                f.write(json.dumps({"table": name, "columns": block}, separators=(",", ":"),
+                                   default=encode_value) + "\n")
+                progress.add(len(rows))
+            progress.report()
+    db.session.rollback()
+
+
+def encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError("Cannot export %r" % value)
+
+
+def decode_values(column, values):
+    if isinstance(column.type, DateTime):
+        return [datetime.fromisoformat(value) if value is not None else None for value in values]
+    return values
+
+
+def copy_value(value):
+    # Postgres COPY text format
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_rows(connection, table, columns, rows):
+    """COPY rows into table on Postgres (psycopg2), returns False if unsupported."""
+    cursor = connection.connection.dbapi_connection.cursor()
+    if not hasattr(cursor, "copy_expert"):
+        return False
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row) + "\n")
+    buffer.seek(0)
+    cursor.copy_expert('COPY "%s" (%s) FROM STDIN' % (table.name, ", ".join('"%s"' % c for c in columns)), buffer)
+    return True
+
+
+@snapshot_cli.command("import")
+@click.argument("path")
+@click.option("--replace", is_flag=True, help="Delete the existing rows first.")
+def import_snapshot(path, replace):
+    """Load a snapshot written by `flask snapshot export` into the database.
+
+    Uses COPY on Postgres and executemany elsewhere, one block at a time,
+    so memory stays bounded by the export chunk size.
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    if replace:
+        for name in reversed(TABLES):
+            connection.execute(db.metadata.tables[name].delete())
+    else:
+        for name in TABLES:
+            table = db.metadata.tables[name]
+            if connection.execute(select(func.count()).select_from(table)).scalar():
+                raise click.ClickException("Table %s is not empty, use --replace" % name)
+
+    use_copy = dialect == "postgresql"
+    progress = None
+    with gzip.open(path, "rt", encoding="utf8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != FORMAT:
+            raise click.ClickException("%s is not a snapshot file" % path)
+        for line in f:
+            block = json.loads(line)
+            table = db.metadata.tables[block["table"]]
+            if progress is None or progress.table != table.name:
+                if progress is not None:
+                    progress.report()
+                progress = Progress(table.name)
+            # Ignore columns the current schema no longer has. change.txid
+            # holds transaction ids of the exporting database, which may be
+            # ahead of this one's and would hide the rows from GET /changes
+            columns = [column for column in block["columns"] if column in table.c]
+            if table.name == "change":
+                columns = [column for column in columns if column != "txid"]
+            values = [decode_values(table.c[column], block["columns"][column]) for column in columns]
+            rows = list(zip(*values))
+            if use_copy:
+                use_copy = copy_rows(connection, table, columns, rows)
+            if not use_copy:
+                connection.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+            progress.add(len(rows))
+        if progress is not None:
+            progress.report()
+
+    if dialect == "postgresql":
+        # Rows were inserted with explicit ids, move the sequences past them
+        for name in TABLES:
+            connection.execute(text(
+                "SELECT setval(pg_get_serial_sequence('\"%s\"', 'id'), "
+                "COALESCE((SELECT MAX(id) FROM \"%s\"), 0) + 1, false)" % (name, name)))
+    db.session.commit()
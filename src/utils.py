@@ -1,4 +1,10 @@
-from flask import jsonify, url_for
+import base64
+from urllib.parse import urlencode
+from flask import jsonify, url_for, request, json, Response, stream_with_context
+
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+NDJSON_MIMETYPE = "application/x-ndjson"
 
 class APIException(Exception):
     status_code = 400
@@ -15,13 +21,103 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, parse=int):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return parse(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise APIException("Invalid cursor", status_code=400)
+
+def paginate(query, id_column):
+    """Keyset pagination over id_column driven by ?limit= and ?after=.
+
+    Returns (rows, next_cursor). Without ?limit the whole query is returned
+    so unpaginated clients keep working.
+    """
+    limit = request.args.get("limit")
+    after = request.args.get("after")
+    if after is not None:
+        query = query.filter(id_column > decode_cursor(after))
+    query = query.order_by(id_column)
+    if limit is None:
+        return query.all(), None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise APIException("Invalid limit", status_code=400)
+    if limit < 1:
+        raise APIException("Invalid limit", status_code=400)
+    limit = min(limit, MAX_PAGE_SIZE)
+    # Fetch one extra row to know if there is a next page
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].id)
+
+def add_pagination_headers(response, next_cursor):
+    if next_cursor is not None:
+        args = request.args.to_dict()
+        args["after"] = next_cursor
+        # Query parameters can share a name with a view argument or a url_for
+        # option, so the link is built from the request URL instead
+        next_url = "%s?%s" % (request.base_url, urlencode(args))
+        response.headers["Link"] = '<%s>; rel="next"' % next_url
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+def wants_stream():
+    # Streaming is for full exports, paginated requests keep the normal path
+    if "limit" in request.args:
+        return False
+    if request.args.get("stream") in ("1", "true"):
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def stream_response(query, serialize, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream a query as a JSON array (or NDJSON) without building the full list.
+
+    Rows are fetched with yield_per, which uses a server-side cursor on
+    Postgres, and written out in chunks of chunk_size rows.
+    """
+    ndjson = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+    rows = query.yield_per(chunk_size)
+
+    def encode(chunk, first):
+        if ndjson:
+            return "\n".join(chunk) + "\n"
+        return ("" if first else ",") + ",".join(chunk)
+
+    def generate():
+        if not ndjson:
+            yield "["
+        chunk = []
+        first = True
+        for row in rows:
+            chunk.append(json.dumps(serialize(row)))
+            if len(chunk) >= chunk_size:
+                yield encode(chunk, first)
+                first = False
+                chunk = []
+        if chunk:
+            yield encode(chunk, first)
+        if not ndjson:
+            yield "]"
+
+    mimetype = NDJSON_MIMETYPE if ndjson else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if 'admin' in app.blueprints else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
@@ -0,0 +1,46 @@
+import app as app_module
+from sqlalchemy import insert
+from models import db, Planet
+
+
+def test_failing_write_is_rolled_back_alone(app, client, monkeypatch):
+    record_changes = app_module.record_changes
+
+    def fail_on_alderaan(model, ids, deleted=False):
+        # Runs after the planet's INSERT, inside the sub-request's savepoint
+        if model is Planet and db.session.get(Planet, ids[0]).name == "Alderaan":
+            raise RuntimeError("boom")
+        record_changes(model, ids, deleted=deleted)
+
+    monkeypatch.setattr(app_module, "record_changes", fail_on_alderaan)
+    response = client.post("/batch", json=[
+        {"method": "POST", "path": "/planet", "body": {"name": "Tatooine"}},
+        {"method": "POST", "path": "/planet", "body": {"name": "Alderaan"}},
+        {"method": "POST", "path": "/planet", "body": {"name": "Hoth"}},
+        {"path": "/planets"}])
+    assert response.status_code == 200
+    results = response.get_json()
+    assert [result["status"] for result in results] == [201, 500, 201, 200]
+    assert [planet["name"] for planet in results[3]["body"]] == ["Tatooine", "Hoth"]
+
+    with app.app_context():
+        assert db.session.scalars(db.select(Planet.name).order_by(Planet.id)).all() == ["Tatooine", "Hoth"]
+
+
+def test_failing_read_between_writes(app, client, monkeypatch):
+    from cache import cache
+
+    def broken_get_entity(model, id):
+        # A statement that has to be undone, then a failure
+        db.session.execute(insert(Planet).values(name="Ghost"))
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(cache, "get_entity", broken_get_entity)
+    response = client.post("/batch", json=[
+        {"method": "POST", "path": "/planet", "body": {"name": "Tatooine"}},
+        {"path": "/planet/1"},
+        {"method": "POST", "path": "/planet", "body": {"name": "Hoth"}}])
+    assert [result["status"] for result in response.get_json()] == [201, 500, 201]
+
+    with app.app_context():
+        assert db.session.scalars(db.select(Planet.name).order_by(Planet.id)).all() == ["Tatooine", "Hoth"]
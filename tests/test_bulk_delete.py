@@ -0,0 +1,85 @@
+from sqlalchemy import insert, select
+from models import db, User, Planet, Character, Favorite
+
+
+def seed(app):
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"email": "user%d@example.com" % i, "password": "secret"} for i in range(2)])
+        db.session.execute(insert(Planet), [{"name": "Tatooine"}, {"name": "Hoth"}, {"name": "Endor"}])
+        db.session.execute(insert(Character).values(name="Yoda"))
+        db.session.commit()
+
+
+def favorite(client, kind, id, user_id):
+    # The people endpoint reads the id from the body
+    body = {"user_id": user_id, "character_id": id}
+    assert client.post("/favorite/%s/%d" % (kind, id), json=body).status_code == 201
+
+
+def head(client):
+    return client.get("/changes").get_json()["next"]
+
+
+def favorites(app):
+    with app.app_context():
+        return db.session.execute(select(Favorite.user_id, Favorite.planet_id, Favorite.character_id)
+                                  .order_by(Favorite.id)).all()
+
+
+def test_deleting_users_drops_their_favorites_and_counts(app, client):
+    seed(app)
+    favorite(client, "planet", 1, 1)
+    favorite(client, "planet", 1, 2)
+    favorite(client, "planet", 2, 1)
+    favorite(client, "people", 1, 1)
+    since = head(client)
+
+    response = client.delete("/users?ids=1,99")
+    assert response.status_code == 200
+    assert response.get_json() == {"deleted": 1}
+    assert favorites(app) == [(2, 1, None)]
+    assert client.get("/planet/1").get_json()["favorite_count"] == 1
+    assert client.get("/planet/2").get_json()["favorite_count"] == 0
+    assert client.get("/people/1").get_json()["favorite_count"] == 0
+
+    feed = client.get("/changes?since=%s" % since).get_json()
+    assert sorted(feed["deleted"]["favorites"]) == [1, 3, 4]
+    assert [(planet["id"], planet["favorite_count"]) for planet in feed["planets"]] == [(1, 1), (2, 0)]
+
+
+def test_deleting_planets_cascades_and_leaves_tombstones(app, client):
+    seed(app)
+    favorite(client, "planet", 1, 1)
+    favorite(client, "planet", 3, 2)
+    favorite(client, "people", 1, 1)
+    # Cached before the delete
+    assert client.get("/planet/1").status_code == 200
+    since = head(client)
+
+    response = client.delete("/planets?ids=1,2,99")
+    assert response.get_json() == {"deleted": 2}
+    assert client.get("/planet/1").status_code == 404
+    assert [planet["name"] for planet in client.get("/planets").get_json()] == ["Endor"]
+    assert favorites(app) == [(2, 3, None), (1, None, 1)]
+
+    feed = client.get("/changes?since=%s" % since).get_json()
+    assert feed["deleted"] == {"planets": [1, 2], "people": [], "favorites": [1]}
+
+
+def test_unknown_ids_delete_nothing(app, client):
+    seed(app)
+    favorite(client, "people", 1, 1)
+    since = head(client)
+
+    response = client.delete("/people?ids=5,6")
+    assert response.get_json() == {"deleted": 0}
+    assert client.get("/people/1").status_code == 200
+    feed = client.get("/changes?since=%s" % since).get_json()
+    assert feed["deleted"] == {"planets": [], "people": [], "favorites": []}
+
+
+def test_invalid_ids_are_rejected(app, client):
+    assert client.delete("/people").status_code == 400
+    assert client.delete("/people?ids=1,x").status_code == 400
+    assert client.delete("/users?ids=").status_code == 400
@@ -0,0 +1,43 @@
+from sqlalchemy import insert
+import app as app_module
+import batch
+import favorites
+from cache import EntityCache, LRUCache
+from models import db, User, Planet
+
+
+class RecordingCache(LRUCache):
+    def __init__(self):
+        super().__init__()
+        self.deleted = []
+
+    def delete(self, key):
+        self.deleted.append(key)
+        super().delete(key)
+
+
+def test_stand_in_backend_is_kept(app, client, monkeypatch):
+    with app.app_context():
+        db.session.execute(insert(User).values(email="user@example.com", password="secret"))
+        db.session.execute(insert(Planet).values(name="Tatooine"))
+        db.session.commit()
+    # Would need the redis package if init_app built its own backend
+    monkeypatch.setenv("CACHE_REDIS_URL", "redis://localhost:1/0")
+    stand_in = RecordingCache()
+    entity_cache = EntityCache(backend=stand_in)
+    entity_cache.init_app(app)
+    assert entity_cache.backend is stand_in
+    for module in (app_module, batch, favorites):
+        monkeypatch.setattr(module, "cache", entity_cache)
+
+    assert client.get("/planet/1").get_json()["favorite_count"] == 0
+    assert client.get("/planet/1").get_json()["favorite_count"] == 0
+    assert (entity_cache.hits, entity_cache.misses) == (1, 1)
+    assert len(stand_in) == 1
+
+    # The write drops the cached planet, the next read goes to the database
+    assert client.post("/favorite/planet/1", json={"user_id": 1}).status_code == 201
+    assert "planet:1" in stand_in.deleted
+    assert client.get("/planet/1").get_json()["favorite_count"] == 1
+    assert (entity_cache.hits, entity_cache.misses) == (1, 2)
+    assert entity_cache.stats()["backend"] == "RecordingCache"
@@ -0,0 +1,53 @@
+from sqlalchemy import insert
+from models import db, User
+
+
+def changes(client, since=None, limit=None):
+    args = {}
+    if since is not None:
+        args["since"] = since
+    if limit is not None:
+        args["limit"] = limit
+    response = client.get("/changes", query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_feed_returns_writes_tombstones_and_pages(app, client):
+    with app.app_context():
+        db.session.execute(insert(User).values(email="user@example.com", password="secret"))
+        db.session.commit()
+    for name in ("Tatooine", "Alderaan", "Hoth"):
+        assert client.post("/planet", json={"name": name}).status_code == 201
+
+    first = changes(client, limit=2)
+    assert [planet["name"] for planet in first["planets"]] == ["Tatooine", "Alderaan"]
+    assert first["has_more"]
+    second = changes(client, since=first["next"], limit=2)
+    assert [planet["name"] for planet in second["planets"]] == ["Hoth"]
+    assert not second["has_more"]
+    assert changes(client, since=second["next"])["next"] == second["next"]
+
+    assert client.post("/favorite/planet/1", json={"user_id": 1}).status_code == 201
+    after_favorite = changes(client, since=second["next"])
+    assert [favorite["planet_id"] for favorite in after_favorite["favorites"]] == [1]
+    assert [planet["favorite_count"] for planet in after_favorite["planets"]] == [1]
+
+    # The favorite goes with the planet through ON DELETE CASCADE
+    assert client.delete("/planet/1").status_code == 200
+    deleted = changes(client, since=after_favorite["next"])
+    assert deleted["deleted"] == {"planets": [1], "people": [], "favorites": [1]}
+    assert deleted["planets"] == [] and deleted["favorites"] == []
+
+    # A client starting from scratch only sees the latest entry per row
+    everything = changes(client)
+    assert [planet["name"] for planet in everything["planets"]] == ["Alderaan", "Hoth"]
+    assert everything["deleted"]["planets"] == [1]
+
+
+def test_tokens_from_before_txid_are_accepted(app, client):
+    for name in ("Tatooine", "Alderaan"):
+        assert client.post("/planet", json={"name": name}).status_code == 201
+    # A bare entry id, as handed out before tokens carried a txid
+    response = changes(client, since="MQ")
+    assert [planet["name"] for planet in response["planets"]] == ["Alderaan"]
@@ -0,0 +1,38 @@
+import gzip
+import pytest
+from sqlalchemy import insert
+from models import db, Planet
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+@pytest.fixture
+def planets(app):
+    with app.app_context():
+        db.session.execute(insert(Planet), [
+            {"name": "Planet %d" % i, "description": "Planet number %d" % i} for i in range(100)])
+        db.session.commit()
+
+
+def test_msgpack_is_compressed(client, planets):
+    msgpack = pytest.importorskip("msgpack")
+    response = client.get("/planets", headers={"Accept": "application/msgpack", **GZIP})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(msgpack.unpackb(gzip.decompress(response.get_data()))) == 100
+
+
+def test_compressed_body_has_weak_etag(client, planets):
+    identity = client.get("/planets")
+    compressed = client.get("/planets", headers=GZIP)
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    etag, weak = identity.get_etag()
+    assert not weak
+    assert compressed.headers["ETag"] == 'W/"%s"' % etag
+
+    response = client.get("/planets", headers={"If-None-Match": compressed.headers["ETag"], **GZIP})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == compressed.headers["ETag"]
+    response = client.get("/planets", headers={"If-None-Match": identity.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == identity.headers["ETag"]
@@ -0,0 +1,37 @@
+from sqlalchemy import insert
+from models import db, Planet
+
+
+def seed_planets(app, count):
+    with app.app_context():
+        db.session.execute(insert(Planet), [{"name": "Planet %d" % i} for i in range(count)])
+        db.session.commit()
+
+
+def test_etag_changes_when_a_deleted_id_is_reused(app, client):
+    seed_planets(app, 3)
+    etag = client.get("/planets").headers["ETag"]
+
+    assert client.delete("/planet/3").status_code == 200
+    response = client.post("/planet", json={"name": "CHANGED"})
+    assert response.get_json()["id"] == 3
+
+    response = client.get("/planets", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.get_json()[-1]["name"] == "CHANGED"
+
+
+def test_etag_changes_on_recount(app, client):
+    seed_planets(app, 3)
+    with app.app_context():
+        db.session.execute(db.update(Planet).where(Planet.id == 1).values(favorite_count=5, updated_at=None))
+        db.session.commit()
+    etag = client.get("/planets").headers["ETag"]
+
+    result = app.test_cli_runner().invoke(args=["favorites", "recount"])
+    assert result.exit_code == 0
+
+    response = client.get("/planets", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]["favorite_count"] == 0
@@ -0,0 +1,41 @@
+from sqlalchemy import insert
+from models import db, User, Planet
+
+
+def seed(app):
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"email": "user%d@example.com" % i, "password": "secret"} for i in range(2)])
+        db.session.execute(insert(Planet).values(name="Tatooine"))
+        db.session.commit()
+
+
+def test_user_favorites_etag_follows_favorite_count(app, client):
+    seed(app)
+    assert client.post("/favorite/planet/1", json={"user_id": 1}).status_code == 201
+    response = client.get("/users/1/favorites")
+    assert response.get_json()[0]["planet"]["favorite_count"] == 1
+    etag = response.headers["ETag"]
+
+    # Another user's favorite changes the planet embedded in user 1's list
+    assert client.post("/favorite/planet/1", json={"user_id": 2}).status_code == 201
+    response = client.get("/users/1/favorites", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()[0]["planet"]["favorite_count"] == 2
+
+    assert client.delete("/favorite/planet/1?user_id=2").status_code == 200
+    response = client.get("/users/1/favorites", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.get_json()[0]["planet"]["favorite_count"] == 1
+
+
+def test_duplicate_favorites_are_skipped_with_on_conflict(app, client):
+    seed(app)
+    assert client.post("/favorite/planet/1", json={"user_id": 1}).status_code == 201
+    assert client.post("/favorite/planet/1", json={"user_id": 1}).status_code == 409
+
+    response = client.post("/favorite/bulk", json=[
+        {"user_id": 1, "planet_id": 1}, {"user_id": 2, "planet_id": 1}])
+    assert response.status_code == 207
+    assert [item["status"] for item in response.get_json()] == [409, 201]
+    assert client.get("/planet/1").get_json()["favorite_count"] == 2
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Planet
+from groupcommit import favorite_writes
+
+
+@pytest.fixture
+def grouped_app(app, monkeypatch):
+    # A group closes as soon as two writes are in it
+    monkeypatch.setenv("FAVORITE_GROUP_COMMIT_MS", "2000")
+    monkeypatch.setenv("FAVORITE_GROUP_COMMIT_MAX", "2")
+    from app import create_app
+    grouped = create_app({"PROFILE": "api", "TESTING": True})
+    with grouped.app_context():
+        db.session.execute(insert(User), [
+            {"email": "user%d@example.com" % i, "password": "secret"} for i in range(2)])
+        db.session.execute(insert(Planet).values(name="Tatooine"))
+        db.session.commit()
+    yield grouped
+    favorite_writes.window = 0.0
+
+
+def run_together(*calls):
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+
+    def worker(index, call):
+        barrier.wait()
+        try:
+            results[index] = call()
+        except Exception as error:
+            results[index] = error
+
+    threads = [threading.Thread(target=worker, args=(index, call)) for index, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def test_same_favorite_twice_in_one_group(grouped_app):
+    def add():
+        return grouped_app.test_client().post("/favorite/planet/1", json={"user_id": 1}).status_code
+
+    groups = favorite_writes.groups
+    assert sorted(run_together(add, add)) == [201, 409]
+    assert favorite_writes.groups == groups + 1
+    assert grouped_app.test_client().get("/planet/1").get_json()["favorite_count"] == 1
+
+
+def test_failing_write_gets_its_own_error(grouped_app):
+    def add(user_id):
+        def call():
+            with grouped_app.app_context():
+                favorite = favorite_writes.insert(user_id, planet_id=1)
+                return favorite.id if favorite is not None else None
+        return call
+
+    retried = favorite_writes.retried
+    # User 99 doesn't exist, its row fails the foreign key
+    good, bad = run_together(add(1), add(99))
+    assert isinstance(bad, IntegrityError)
+    assert isinstance(good, int)
+    assert favorite_writes.retried == retried + 1
+    client = grouped_app.test_client()
+    assert client.get("/planet/1").get_json()["favorite_count"] == 1
+    assert [favorite["user_id"] for favorite in client.get("/users/favorites").get_json()] == [1]
@@ -0,0 +1,22 @@
+import threading
+from metrics import Metrics
+
+
+def test_stores_of_exited_threads_are_folded():
+    metrics = Metrics()
+
+    def request():
+        metrics.observe_request("/planets", "GET", 200, 0.01, 2, 0.001, 100)
+
+    # Like the threaded dev server, one thread per request
+    for _ in range(50):
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+    request()
+
+    totals = metrics.merged()
+    assert len(metrics._stores) == 1
+    assert totals.requests[("/planets", "GET", 200)] == 51
+    assert totals.sql_queries["/planets"] == 102
+    assert sum(totals.duration_buckets["/planets"]) == 51
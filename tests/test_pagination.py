@@ -0,0 +1,33 @@
+from sqlalchemy import insert
+from models import db, User, Planet, Favorite
+
+
+def seed(app):
+    with app.app_context():
+        db.session.execute(insert(User).values(email="user@example.com", password="secret"))
+        db.session.execute(insert(Planet), [{"name": "Planet %d" % i} for i in range(3)])
+        db.session.execute(insert(Favorite), [{"user_id": 1, "planet_id": i} for i in range(1, 4)])
+        db.session.commit()
+
+
+def test_next_link_keeps_query_parameters(app, client):
+    seed(app)
+    response = client.get("/planets?limit=1")
+    cursor = response.headers["X-Next-Cursor"]
+    assert response.headers["Link"] == '<http://localhost/planets?limit=1&after=%s>; rel="next"' % cursor
+
+    response = client.get(response.headers["Link"][1:].split(">")[0])
+    assert response.status_code == 200
+    assert response.get_json()[0]["name"] == "Planet 1"
+
+
+def test_next_link_with_colliding_parameter_names(app, client):
+    seed(app)
+    # user_id is also a view argument, _external a url_for option
+    response = client.get("/users/1/favorites?limit=1&user_id=5")
+    assert response.status_code == 200
+    assert response.headers["Link"].startswith("<http://localhost/users/1/favorites?limit=1&user_id=5&after=")
+
+    response = client.get("/planets?limit=1&_external=0")
+    assert response.status_code == 200
+    assert "_external=0" in response.headers["Link"]
@@ -0,0 +1,70 @@
+from sqlalchemy import event, insert
+from models import db, User, Planet, Favorite
+
+
+def seed(app):
+    with app.app_context():
+        db.session.execute(insert(User).values(email="user@example.com", password="secret"))
+        db.session.execute(insert(Planet), [{"name": "Planet %d" % i, "description": "Desc %d" % i}
+                                            for i in range(3)])
+        db.session.execute(insert(Favorite), [{"user_id": 1, "planet_id": 2}])
+        db.session.commit()
+
+
+def test_fields_are_selected_in_sql(app, client):
+    seed(app)
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/planets?fields=name")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200
+    # id is always included, for the next cursor
+    assert response.get_json() == [{"id": i + 1, "name": "Planet %d" % i} for i in range(3)]
+    select = [statement for statement in statements if "FROM planet" in statement and "count(" not in statement]
+    assert select and "description" not in select[0]
+
+
+def test_fields_on_a_single_row(app, client):
+    seed(app)
+    response = client.get("/planet/2?fields=description")
+    assert response.get_json() == {"id": 2, "description": "Desc 1"}
+
+
+def test_fields_with_a_relationship(app, client):
+    seed(app)
+    response = client.get("/users?fields=email,favorites")
+    assert response.status_code == 200
+    [user] = response.get_json()
+    assert set(user) == {"id", "email", "favorites"}
+    assert [favorite["planet_id"] for favorite in user["favorites"]] == [2]
+
+
+def test_unknown_fields_are_rejected(app, client):
+    seed(app)
+    response = client.get("/planets?fields=name,password")
+    assert response.status_code == 400
+    assert "password" in response.get_json()["message"]
+    assert client.get("/users?fields=password").status_code == 400
+
+
+def test_columnar_format(app, client):
+    seed(app)
+    expected = {"id": [1, 2, 3], "name": ["Planet 0", "Planet 1", "Planet 2"]}
+    response = client.get("/planets?fields=name&format=columnar")
+    assert response.status_code == 200
+    assert response.get_json() == expected
+
+    response = client.get("/planets?fields=name", headers={"Accept": "application/vnd.columnar+json"})
+    assert response.get_json() == expected
+    assert "Accept" in response.headers["Vary"]
+
+
+def test_columnar_format_of_an_empty_page(app, client):
+    assert client.get("/planets?format=columnar").get_json() == {}
@@ -0,0 +1,116 @@
+import pytest
+from ratelimit import limiter, RateLimiter, MemoryBucketStore
+
+
+@pytest.fixture
+def limited_client(app, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.setenv("RATE_LIMIT_RATE", "0.001")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "2")
+    from app import create_app
+    limited = create_app({"PROFILE": "api", "TESTING": True})
+    limiter.store.clear()
+    yield limited.test_client()
+    limiter.store.clear()
+
+
+def test_clients_behind_the_proxy_get_their_own_bucket(limited_client):
+    # Every request arrives from the proxy's address
+    first = {"X-Forwarded-For": "203.0.113.1"}
+    second = {"X-Forwarded-For": "203.0.113.2"}
+    assert limited_client.get("/planets", headers=first).status_code == 200
+    assert limited_client.get("/planets", headers=first).status_code == 200
+    assert limited_client.get("/planets", headers=first).status_code == 429
+    assert limited_client.get("/planets", headers=second).status_code == 200
+
+
+def test_only_the_trusted_hop_is_used(limited_client):
+    # A forged first entry is ignored, the proxy appends the real address
+    for forged in ("198.51.100.1", "198.51.100.2"):
+        headers = {"X-Forwarded-For": "%s, 203.0.113.1" % forged}
+        limited_client.get("/planets", headers=headers)
+    response = limited_client.get("/planets", headers={"X-Forwarded-For": "198.51.100.3, 203.0.113.1"})
+    assert response.status_code == 429
+
+
+def test_only_allow_listed_api_keys_get_their_own_bucket(app, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.setenv("RATE_LIMIT_RATE", "0.001")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "2")
+    monkeypatch.setenv("RATE_LIMIT_API_KEYS", "partner-key, other-key")
+    monkeypatch.setenv("RATE_LIMIT_REDIS_URL", "redis://localhost:1/0")
+    store = MemoryBucketStore()
+    RateLimiter(store=store).init_app(app)
+    client = app.test_client()
+    assert client.get("/planets").status_code == 200
+    assert client.get("/planets").status_code == 200
+    assert client.get("/planets").status_code == 429
+
+    # Made-up keys share the drained bucket of the address
+    for number in range(10):
+        assert client.get("/planets", headers={"X-API-Key": "k%d" % number}).status_code == 429
+    assert client.get("/planets", headers={"X-API-Key": "partner-key"}).status_code == 200
+    assert "key:partner-key" in store._buckets
+
+
+def test_batch_is_charged_its_full_cost(limited_client):
+    # GET /planets costs 1 token, the bucket holds 2
+    over = [{"path": "/planets"}] * 3
+    assert limited_client.post("/batch", json=over).status_code == 429
+    assert limited_client.post("/batch", json=over[:2]).status_code == 200
+    assert limited_client.get("/planets").status_code == 429
+
+
+def test_asgi_ignores_made_up_api_keys(app, monkeypatch):
+    pytest.importorskip("aiosqlite")
+    import asyncio
+    from asgi import AsyncAPI
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.setenv("RATE_LIMIT_RATE", "0.001")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "2")
+    limiter.init_app(app)
+    limiter.store.clear()
+    api = AsyncAPI(app)
+
+    async def get(api_key):
+        scope = {"type": "http", "method": "GET", "path": "/planets", "query_string": b"",
+                 "headers": [(b"x-api-key", api_key.encode())], "client": ("192.0.2.1", 1234)}
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+        await api(scope, receive, send)
+        return sent[0]["status"]
+
+    async def run():
+        try:
+            return [await get("k%d" % number) for number in range(10)]
+        finally:
+            await api.engine.dispose()
+
+    try:
+        assert asyncio.run(run()) == [200, 200] + [429] * 8
+    finally:
+        limiter.store.clear()
+
+
+def test_streamed_response_keeps_its_slot(app, monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.setenv("RATE_LIMIT_MAX_CONCURRENT", "1")
+    monkeypatch.setenv("RATE_LIMIT_QUEUE_TIMEOUT_MS", "10")
+    from app import create_app
+    limited = create_app({"PROFILE": "api", "TESTING": True})
+    limiter._semaphores.clear()
+    client = limited.test_client()
+
+    # GET /users is expensive; the body isn't read yet
+    streaming = client.get("/users?stream=1", buffered=False)
+    assert streaming.status_code == 200
+    assert client.get("/users").status_code == 503
+    assert streaming.get_data(as_text=True) == "[]"
+    streaming.close()
+    assert client.get("/users").status_code == 200
+    limiter._semaphores.clear()
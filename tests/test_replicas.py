@@ -0,0 +1,29 @@
+import shutil
+from sqlalchemy import insert
+from models import db, User, Planet
+
+
+def test_cache_is_filled_from_the_primary(app, tmp_path, monkeypatch):
+    with app.app_context():
+        db.session.execute(insert(User).values(email="user@example.com", password="secret"))
+        db.session.execute(insert(Planet).values(name="Tatooine"))
+        db.session.commit()
+        primary = db.engine.url.database
+    # A replica that never catches up
+    replica = str(tmp_path / "replica.db")
+    shutil.copy(primary, replica)
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", "sqlite:///%s" % replica)
+    from app import create_app
+    from cache import cache
+    replicated = create_app({"PROFILE": "api", "TESTING": True})
+    cache.clear()
+
+    assert replicated.test_client().get("/planet/1").get_json()["favorite_count"] == 0
+    writer = replicated.test_client()
+    assert writer.post("/favorite/planet/1", json={"user_id": 1}).status_code == 201
+
+    # A client outside the read-your-writes window still gets the new row
+    reader = replicated.test_client()
+    assert reader.get("/planet/1").get_json()["favorite_count"] == 1
+    assert reader.get("/planet/1").get_json()["favorite_count"] == 1
+    assert replicated.extensions["replicas"].replicas[0].healthy
@@ -0,0 +1,24 @@
+from sqlalchemy import insert
+from models import db, Planet
+
+
+def names(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return [planet["name"] for planet in response.get_json()]
+
+
+def test_search_matches_inside_names(app, client):
+    with app.app_context():
+        db.session.execute(insert(Planet), [{"name": name} for name in ("Alderaan", "Tatooine", "Dagobah")])
+        db.session.commit()
+    assert names(client, "/planets?search=der") == ["Alderaan"]
+    assert names(client, "/planets?search=OOI") == ["Tatooine"]
+    # Shorter than a trigram
+    assert names(client, "/planets?search=ob") == ["Dagobah"]
+    assert names(client, "/planets?prefix=tat") == ["Tatooine"]
+    assert names(client, "/planets?prefix=der") == []
+
+    # New rows are indexed by the triggers
+    assert client.post("/planet", json={"name": "Yavin"}).status_code == 201
+    assert names(client, "/planets?search=avi") == ["Yavin"]
@@ -0,0 +1,65 @@
+from sqlalchemy import select
+from snapshot import TABLES
+from models import db
+
+
+def dump(app):
+    # change.txid is not imported, the target database assigns its own
+    rows = {}
+    with app.app_context():
+        for name in TABLES:
+            table = db.metadata.tables[name]
+            columns = [column for column in table.c if column.name != "txid"]
+            rows[name] = db.session.execute(select(*columns).order_by(table.c.id)).all()
+        db.session.rollback()
+    return rows
+
+
+def clear(app):
+    with app.app_context():
+        for name in reversed(TABLES):
+            db.session.execute(db.metadata.tables[name].delete())
+        db.session.commit()
+
+
+def test_export_import_round_trip(app, client, tmp_path):
+    client.post("/users", json={"email": "luke@example.com", "password": "secret", "first_name": "Luke"})
+    for name in ("Tatooine", "Hoth", "Dagobah"):
+        client.post("/planet", json={"name": name, "description": "Line one\nline\ttwo"})
+    client.post("/people", json={"name": "Yoda"})
+    client.post("/favorite/planet/2", json={"user_id": 1})
+    client.post("/favorite/people/1", json={"user_id": 1})
+    before = dump(app)
+    assert all(before[name] for name in TABLES)
+
+    path = str(tmp_path / "snapshot.ndjson.gz")
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["snapshot", "export", path, "--chunk-size", "2"])
+    assert result.exit_code == 0, result.output
+
+    clear(app)
+    assert not any(dump(app).values())
+    result = runner.invoke(args=["snapshot", "import", path])
+    assert result.exit_code == 0, result.output
+    assert dump(app) == before
+
+    # The ids continue after the imported ones
+    response = client.post("/planet", json={"name": "Endor"})
+    assert response.status_code == 201
+    assert response.get_json()["id"] == 4
+    assert dump(app)["change"][-1].id > before["change"][-1].id
+
+
+def test_import_refuses_non_empty_tables(app, client, tmp_path):
+    client.post("/planet", json={"name": "Tatooine"})
+    path = str(tmp_path / "snapshot.ndjson.gz")
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["snapshot", "export", path]).exit_code == 0
+
+    result = runner.invoke(args=["snapshot", "import", path])
+    assert result.exit_code != 0
+    assert "not empty" in result.output
+
+    result = runner.invoke(args=["snapshot", "import", path, "--replace"])
+    assert result.exit_code == 0, result.output
+    assert [planet["name"] for planet in client.get("/planets").get_json()] == ["Tatooine"]
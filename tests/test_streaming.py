@@ -0,0 +1,40 @@
+import json
+from sqlalchemy import insert
+from models import db, Planet
+
+
+def seed(app, count):
+    with app.app_context():
+        db.session.execute(insert(Planet), [{"name": "Planet %d" % i} for i in range(count)])
+        db.session.commit()
+
+
+def test_stream_parameter_streams_a_json_array(app, client):
+    # More rows than one chunk
+    seed(app, 1205)
+    response = client.get("/planets?stream=1", buffered=False)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert "Content-Length" not in response.headers
+    assert response.mimetype == "application/json"
+    chunks = list(response.response)
+    assert len(chunks) > 2
+    planets = json.loads(b"".join(chunks))
+    assert [planet["name"] for planet in planets] == ["Planet %d" % i for i in range(1205)]
+
+
+def test_ndjson_accept_header_streams_one_row_per_line(app, client):
+    seed(app, 3)
+    response = client.get("/planets", headers={"Accept": "application/x-ndjson"}, buffered=False)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == "application/x-ndjson"
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["Planet 0", "Planet 1", "Planet 2"]
+
+
+def test_paginated_requests_are_not_streamed(app, client):
+    seed(app, 3)
+    response = client.get("/planets?stream=1&limit=2")
+    assert "Content-Length" in response.headers
+    assert len(response.get_json()) == 2
@@ -0,0 +1,51 @@
+from sqlalchemy import event, insert
+from models import db, User, Planet, Favorite
+
+
+def seed_users(app, start, count):
+    with app.app_context():
+        db.session.execute(insert(User), [
+            {"email": "user%d@example.com" % i, "password": "secret"} for i in range(start, start + count)])
+        planet_id = db.session.execute(insert(Planet).values(name="Planet %d" % start)).inserted_primary_key[0]
+        user_ids = db.session.scalars(db.select(User.id).order_by(User.id)).all()
+        db.session.execute(insert(Favorite), [
+            {"user_id": user_id, "planet_id": planet_id} for user_id in user_ids[start:]])
+        db.session.commit()
+
+
+def count_statements(app, client, url):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    return response, statements
+
+
+def data_queries(statements):
+    # Leave out the ETag queries of conditional_collection
+    return [statement for statement in statements if "count(" not in statement]
+
+
+def test_users_query_count_does_not_grow_with_users(app, client):
+    seed_users(app, 0, 20)
+    response, small = count_statements(app, client, "/users?limit=1000")
+    assert len(response.get_json()) == 20
+
+    seed_users(app, 20, 20)
+    response, large = count_statements(app, client, "/users?limit=1000")
+    assert len(response.get_json()) == 40
+    assert all(len(user["favorites"]) == 1 for user in response.get_json())
+
+    # One query for the page of users, one SELECT ... IN for their favorites
+    assert len(data_queries(small)) == 2
+    assert len(data_queries(large)) == 2
+    assert len(small) == len(large)